@@ -0,0 +1,424 @@
+'''
+Fetchers.py
+│
+├── Imports
+│   ├── os
+│   ├── time
+│   ├── asyncio
+│   ├── queue
+│   ├── random
+│   ├── logging
+│   ├── threading
+│   ├── deque from collections
+│   ├── contextmanager from contextlib
+│   ├── urlparse from urllib.parse
+│   └── get_metrics from Metrics
+│
+├── Functions
+│   ├── gen_edge_driver(headless=True)
+│   └── gen_driver_errors()
+│
+└── Classes
+    ├── DriverPool
+    │   ├── __init__(self, size=1, max_pages=50, driver_factory=gen_edge_driver)
+    │   ├── is_healthy(self, driver)
+    │   ├── quit(self, driver)
+    │   ├── acquire(self)
+    │   ├── release(self, driver, recycle=False)
+    │   ├── driver(self)
+    │   └── close(self)
+    │
+    ├── RateLimiter
+    │   ├── __init__(self, rate, capacity=1)
+    │   ├── reserve(self)
+    │   ├── acquire(self)
+    │   └── acquire_async(self)
+    │
+    ├── RetryPolicy
+    │   ├── __init__(self, base=30, cap=600, max_attempts=5, retry_errors=None)
+    │   └── delay(self, attempt)
+    │
+    ├── HostState
+    │
+    ├── HostThrottle
+    │   ├── __init__(self, min_interval=0, max_interval=60, window=50, trip_rate=0.5, min_samples=10, cooldown=900, max_cooldown=4 * 3600, log_dir=None)
+    │   ├── get_state(self, host)
+    │   ├── block_rate(self, state)
+    │   ├── interval(self, state)
+    │   ├── before_request(self, host)
+    │   ├── record(self, host, blocked, generation=None)
+    │   ├── trip(self, host, state, now)
+    │   ├── log_outcome(self, host, state, blocked)
+    │   └── stats(self)
+    │
+    └── PageFetcher
+        ├── __init__(self, pool=None, wait=5, rate_limiter=None, throttle=None, metrics=None)
+        ├── fetch(self, url, parse=None, is_blocked=None)
+        └── close(self)
+'''
+
+import os
+import time
+import asyncio
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from Metrics import get_metrics
+
+# selenium is imported only once a browser is needed, so the callers that
+# just use RateLimiter or RetryPolicy (the MP3 downloads) start without it
+
+
+def gen_edge_driver(headless=True):
+    from selenium import webdriver
+
+    options = webdriver.EdgeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    return webdriver.Edge(options=options)
+
+def gen_driver_errors():
+    # what a crashed or hung browser raises
+    from selenium.common.exceptions import WebDriverException
+
+    return (WebDriverException,)
+
+
+class DriverPool:
+    # at most `size` long-lived browsers; a driver is handed back with its
+    # cookies cleared, and is quit and replaced after max_pages pages, when
+    # it fails a health check, or when the caller asks for a recycle.
+    # driver_factory is any callable returning an object with get(url),
+    # page_source, current_url, delete_all_cookies() and quit(), so a fake
+    # driver can stand in for Edge
+    def __init__(self, size=1, max_pages=50, driver_factory=gen_edge_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.driver_factory = driver_factory
+        self.driver_errors = gen_driver_errors()
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    def is_healthy(self, driver):
+        try:
+            driver.current_url
+            return True
+        except self.driver_errors:
+            return False
+
+    def quit(self, driver):
+        with self.lock:
+            self.pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except self.driver_errors:
+            pass
+
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self.idle.get_nowait()
+                except queue.Empty:
+                    driver = self.driver_factory()
+                    with self.lock:
+                        self.pages[id(driver)] = 0
+                    return driver
+                if self.is_healthy(driver):
+                    return driver
+                logging.warning('Dropping an unresponsive driver')
+                self.quit(driver)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, driver, recycle=False):
+        with self.lock:
+            self.pages[id(driver)] = self.pages.get(id(driver), 0) + 1
+            worn_out = self.pages[id(driver)] >= self.max_pages
+        try:
+            if recycle or worn_out:
+                self.quit(driver)
+            else:
+                try:
+                    driver.delete_all_cookies()
+                    self.idle.put(driver)
+                except self.driver_errors:
+                    self.quit(driver)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        state = {'recycle': False}
+        try:
+            yield driver, state
+        except BaseException:
+            state['recycle'] = True
+            raise
+        finally:
+            self.release(driver, recycle=state['recycle'])
+
+    def close(self):
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.quit(driver)
+
+
+class RateLimiter:
+    # token bucket: `rate` acquisitions per second on average, at most
+    # `capacity` in a burst; rate=None is unlimited. A caller reserves its
+    # token under the lock and waits outside it, so waiting callers queue
+    # up in order. Threads call acquire, coroutines acquire_async; the
+    # lock is only held for the arithmetic, so it never blocks a loop
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # seconds to wait before the reserved token is due
+        if self.rate is None:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated) * self.rate,
+                )
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy:
+    # exponential backoff with jitter: attempt n waits between half and all
+    # of min(cap, base * 2 ** n) seconds. Callers retry blocked pages and
+    # the exceptions in retry_errors (by default, a browser that crashed or
+    # hung) alike
+    def __init__(self, base=30, cap=600, max_attempts=5, retry_errors=None):
+        self.base = base
+        self.cap = cap
+        self.max_attempts = max_attempts
+        self.retry_errors = gen_driver_errors() if retry_errors is None else retry_errors
+
+    def delay(self, attempt):
+        return min(self.cap, self.base * 2 ** attempt) * random.uniform(0.5, 1)
+
+
+class HostState:
+    __slots__ = (
+        'outcomes', 'n_requests', 'n_blocked', 'first_time', 'next_time',
+        'open_until', 'cooldown', 'half_open', 'n_trips',
+        )
+
+    def __init__(self, window, cooldown):
+        self.outcomes = deque(maxlen=window)
+        self.n_requests = 0
+        self.n_blocked = 0
+        self.first_time = time.monotonic()
+        self.next_time = 0
+        self.open_until = 0
+        self.cooldown = cooldown
+        self.half_open = False
+        self.n_trips = 0
+
+
+class HostThrottle:
+    # per-host pacing driven by the share of blocked pages among the last
+    # `window` requests: the gap between requests grows linearly from
+    # min_interval (no blocks) to max_interval (all blocked). Once at least
+    # min_samples are in and the block rate reaches trip_rate, the circuit
+    # opens and every request to that host waits `cooldown` seconds; the
+    # first request after that decides whether it closes again or reopens
+    # for twice as long (up to max_cooldown). Each outcome can be appended
+    # to a CSV at log_dir for tuning
+    def __init__(
+            self,
+            min_interval=0,
+            max_interval=60,
+            window=50,
+            trip_rate=0.5,
+            min_samples=10,
+            cooldown=900,
+            max_cooldown=4 * 3600,
+            log_dir=None,
+            ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.window = window
+        self.trip_rate = trip_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.log_dir = log_dir
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def get_state(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.window, self.cooldown)
+        return self.hosts[host]
+
+    def block_rate(self, state):
+        if not state.outcomes:
+            return 0
+        return sum(state.outcomes) / len(state.outcomes)
+
+    def interval(self, state):
+        return self.min_interval + (self.max_interval - self.min_interval) * self.block_rate(state)
+
+    def before_request(self, host):
+        # returns the circuit generation (trips so far) the request is
+        # issued in, to hand back to record()
+        while True:
+            with self.lock:
+                state = self.get_state(host)
+                now = time.monotonic()
+                wait = max(state.open_until, state.next_time) - now
+                if wait <= 0:
+                    state.next_time = now + self.interval(state)
+                    return state.n_trips
+            time.sleep(wait)
+
+    def record(self, host, blocked, generation=None):
+        # an outcome of a request issued before the last trip (still in
+        # flight when the circuit opened) is counted, but neither enters the
+        # window nor decides the half-open probe
+        with self.lock:
+            state = self.get_state(host)
+            state.n_requests += 1
+            state.n_blocked += bool(blocked)
+            now = time.monotonic()
+            
+            if generation is None or generation >= state.n_trips:
+                state.outcomes.append(bool(blocked))
+                if state.half_open:
+                    state.half_open = False
+                    if blocked:
+                        state.cooldown = min(state.cooldown * 2, self.max_cooldown)
+                        self.trip(host, state, now)
+                    else:
+                        state.cooldown = self.cooldown
+                elif len(state.outcomes) >= self.min_samples and \
+                        self.block_rate(state) >= self.trip_rate:
+                    self.trip(host, state, now)
+            
+            if self.log_dir is not None:
+                self.log_outcome(host, state, blocked)
+
+    def trip(self, host, state, now):
+        state.open_until = now + state.cooldown
+        state.half_open = True
+        state.n_trips += 1
+        state.outcomes.clear()
+        logging.warning(f'CIRCUIT OPEN FOR {host}: PAUSING {state.cooldown:.0f}s')
+
+    def log_outcome(self, host, state, blocked):
+        new_file = not os.path.exists(self.log_dir)
+        with open(self.log_dir, 'a', encoding='u8') as f:
+            if new_file:
+                f.write('time,host,blocked,block_rate,interval,n_trips\n')
+            f.write(
+                f'{time.time():.3f},{host},{int(bool(blocked))},'
+                f'{self.block_rate(state):.3f},{self.interval(state):.2f},{state.n_trips}\n'
+                )
+
+    def stats(self):
+        # block rate over the window and overall, and pages per minute that
+        # got through, per host
+        with self.lock:
+            now = time.monotonic()
+            return {
+                host: {
+                    'requests': state.n_requests,
+                    'blocked': state.n_blocked,
+                    'block_rate': self.block_rate(state),
+                    'total_block_rate': state.n_blocked / state.n_requests if state.n_requests else 0,
+                    'ok_per_min': (state.n_requests - state.n_blocked) / max(now - state.first_time, 1e-9) * 60,
+                    'interval': self.interval(state),
+                    'circuit_open': state.open_until > now,
+                    'trips': state.n_trips,
+                    }
+                for host, state in self.hosts.items()
+                }
+
+
+class PageFetcher:
+    # what the crawler and the savers need from a browser: the source of a
+    # page, waiting `wait` seconds for it to render. parse, if given, is
+    # applied to the source before it is returned; a page that is_blocked
+    # flags (e.g. a challenge page) sends its driver for recycling. A
+    # rate_limiter shared by all threads caps pages loaded per second, and
+    # the pool size caps concurrent browser sessions. Time spent held back
+    # by the throttle and loading pages goes to the 'throttle_wait' and
+    # 'page_load' stages of metrics, blocked pages to 'blocked'. A fetch
+    # that raises (e.g. a WebDriverException) is recorded with the throttle
+    # as a failure, so it counts against the host and frees the half-open
+    # probe, and goes to 'fetch_error' before the exception is passed on
+    def __init__(self, pool=None, wait=5, rate_limiter=None, throttle=None, metrics=None):
+        self.pool = pool if pool is not None else DriverPool()
+        self.wait = wait
+        self.rate_limiter = rate_limiter
+        self.throttle = throttle if throttle is not None else HostThrottle()
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.n_fetched = 0
+        self.n_blocked = 0
+        self.lock = threading.Lock()
+
+    def fetch(self, url, parse=None, is_blocked=None):
+        host = urlparse(url).netloc
+        with self.metrics.timer('throttle_wait'):
+            generation = self.throttle.before_request(host)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+        failed = True
+        try:
+            with self.pool.driver() as (driver, state):
+                with self.metrics.timer('page_load') as timer:
+                    driver.get(url)
+                    time.sleep(self.wait)
+                    page = driver.page_source
+                    timer.n_bytes = len(page)
+                if parse is not None:
+                    page = parse(page)
+                if is_blocked is not None and is_blocked(page):
+                    state['recycle'] = True
+            failed = state['recycle']
+        except BaseException:
+            self.metrics.add('fetch_error', n_items=1)
+            raise
+        finally:
+            self.throttle.record(host, failed, generation)
+        if failed:
+            self.metrics.add('blocked', n_items=1)
+        with self.lock:
+            self.n_fetched += 1
+            self.n_blocked += failed
+        return page
+
+    def close(self):
+        self.pool.close()
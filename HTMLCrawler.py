@@ -1,123 +1,365 @@
+import os
 import re
+import json
 import time
+import hashlib
 import logging
+import threading
 import pandas as pd
+from collections import deque
 from bs4 import BeautifulSoup
-from selenium import webdriver
+from Fetchers import DriverPool, PageFetcher, RateLimiter, RetryPolicy, HostThrottle
+from utils import load_raw_content_df, setup_logging, write_panel
+from Metrics import get_metrics
 
-def organise_posting(art_list):
-    # organise scraped contents
-    master_url = 'https://seekingalpha.com'
-    trans_df = pd.DataFrame(
-        columns=['ticker', 'title', 'year', 'quarter', 'date', 'url']
-        )
-
-    df_idx = 0
+MASTER_URL = 'https://seekingalpha.com'
+PATTERN_Q = re.compile(r'(\s?Q[1-4]\s?|[Ff]\s?[1-4]Q\s?)')
+PATTERN_Y = re.compile(r'(20\d{2}|[Ff][1-4]Q\d{2})')
+#PATTERN_TIC = re.compile(r'\(([a-zA-Z]+)\)')
 
+def extract_posting_fields(art_list, fields=None):
+    # collect title, post date and url of every call transcript on a page
+    # into plain lists; pass the lists of earlier pages to extend them
+    if fields is None:
+        fields = {'title': [], 'date': [], 'url': []}
     for art in art_list:
-        # get url and full url for a single article
-        ref = art.find('a', attrs={'data-test-id': 'post-list-item-title'}).get('href')
-        full_url = master_url + ref
-        
-        # get tittle of the article
-        title = art.find('a', attrs={'data-test-id': 'post-list-item-title'}).text
+        title_tag = art.find('a', attrs={'data-test-id': 'post-list-item-title'})
+        title = title_tag.text
         if 'Call Transcript' not in title: continue 
-    
-        pattern_q = r'\s?Q[1-4]\s?|[Ff]\s?[1-4]Q\s?'
-        pattern_y = r'20\d{2}|[Ff][1-4]Q\d{2}'
-        #pattern_tic = r'\(([a-zA-Z]+)\)'
-        
-        quarter = re.findall(pattern_q, title)
-        if len(quarter) == 0:
-            quarter = None
-        else:
-            quarter = quarter[0].strip().replace('Q', '').replace('F', '')
-            
-        year = re.findall(pattern_y, title)
-        if len(year) == 0:
-            year = None
-        else:
-            year = year[0].strip()
-            if 'Q' in year:
-                year = '20' + year[-2:] 
-            
-        # if year not in ['2021', '2022', '2023']: continue    
-        # std_tic = re.findall(pattern_tic, title)[0].strip()
-            
-        # get post date of the article
-        post_date = art.find('span', attrs={'data-test-id': 'post-list-date'}).text
         
-        # fill df with necessary info
-        trans_df.loc[df_idx, 'title'] = title
-        trans_df.loc[df_idx, 'year'] = year
-        trans_df.loc[df_idx, 'quarter'] = quarter
-        trans_df.loc[df_idx, 'date'] = post_date
-        trans_df.loc[df_idx, 'url'] = full_url
-        # trans_df.loc[df_idx, 'std_tic'] = std_tic
-        
-        df_idx += 1   
+        fields['title'].append(title)
+        fields['date'].append(art.find('span', attrs={'data-test-id': 'post-list-date'}).text)
+        fields['url'].append(MASTER_URL + title_tag.get('href'))
+    return fields
+
+def gen_posting_df(fields):
+    # year, quarter and transcript id are extracted over the whole batch
+    trans_df = pd.DataFrame(
+        {key: pd.Series(value, dtype=object) for key, value in fields.items()}
+        )
+    
+    quarter = trans_df['title'].str.extract(PATTERN_Q, expand=False)
+    quarter = quarter.str.strip().str.replace('Q', '').str.replace('F', '')
+    
+    year = trans_df['title'].str.extract(PATTERN_Y, expand=False).str.strip()
+    fiscal = year.str.contains('Q', na=False)
+    year[fiscal] = '20' + year[fiscal].str[-2:]
+    
+    trans_df = pd.DataFrame({
+        'ticker': pd.Series(None, index=trans_df.index, dtype=object),
+        'title': trans_df['title'],
+        'year': year.astype(object).where(year.notna(), None),
+        'quarter': quarter.astype(object).where(quarter.notna(), None),
+        'date': trans_df['date'],
+        'url': trans_df['url'],
+        })
     # create a new column for transcript id from transcript url
     # sample transcript url: https://seekingalpha.com/article/4666956-apple-inc-aapl-q1-2024-earnings-call-transcript?source=content_type%3Areact%7Csection%3ATranscripts%7Csection_asset%3ATranscripts%7Cfirst_level_url%3Asymbol%7Cbutton%3ATitle%7Clock_status%3ANo%7Cline%3A1
     trans_df['trans_id'] = trans_df['url'].str.split('article/').str[1].str.split('-').str[0]
 
     return trans_df
 
+def url_to_trans_id(url):
+    return url.split('article/')[1].split('-')[0]
+
+def load_known_ids(panel_dir):
+    # ticker -> set of trans_ids already in a panel file
+    panel = load_raw_content_df(panel_dir, columns=['ticker', 'trans_id'])
+    known_ids = {}
+    for tic, trans_id in zip(panel['ticker'], panel['trans_id'].astype(str)):
+        known_ids.setdefault(tic, set()).add(trans_id)
+    return known_ids
+
+def organise_posting(art_list):
+    # organise scraped contents
+    return gen_posting_df(extract_posting_fields(art_list))
+
+
+def gen_shard_dir(checkpoint_dir, tic):
+    return '/'.join([checkpoint_dir, 'shards', tic.replace('/', '(slash)') + '.parquet'])
+
+def gen_crawl_mode(known_panel_dir=None):
+    # 'full', or 'incremental-<key>' with the key of the known panel's
+    # path, size and mtime, so each version of the panel gets its own mode
+    if known_panel_dir is None:
+        return 'full'
+    stat = os.stat(known_panel_dir)
+    key = hashlib.md5(
+        f'{os.path.abspath(known_panel_dir)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()
+        ).hexdigest()[:16]
+    return f'incremental-{key}'
+
+def gen_checkpoint_dir(crawl_mode):
+    # full crawls checkpoint to Raw_backup, incremental ones to a folder
+    # of their own inside it
+    if crawl_mode == 'full':
+        return 'Raw_backup'
+    return '/'.join(['Raw_backup', crawl_mode])
+
+def load_manifest(checkpoint_dir, crawl_mode=None):
+    # ticker -> manifest entry of every finished ticker; later lines win.
+    # With crawl_mode, a manifest written by another mode is refused: an
+    # incremental run resumed from a full one would skip every ticker
+    manifest = {}
+    manifest_dir = '/'.join([checkpoint_dir, 'manifest.jsonl'])
+    if not os.path.exists(manifest_dir):
+        return manifest
+    with open(manifest_dir, 'r', encoding='u8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by a crash
+                continue
+            if crawl_mode is not None and entry.get('mode', 'full') != crawl_mode:
+                raise ValueError(
+                    f'{checkpoint_dir} holds a {entry.get("mode", "full")} crawl, '
+                    f'not {crawl_mode}; give another checkpoint_dir'
+                    )
+            manifest[entry['ticker']] = entry
+    return manifest
+
+def append_shard(checkpoint_dir, tic, df, crawl_mode='full'):
+    # the shard is moved into place before its manifest line is written,
+    # so the manifest never names a half-written shard. A line cut short
+    # by a crash is ended first, or this one would be joined to it and
+    # skipped with it
+    shard_dir = gen_shard_dir(checkpoint_dir, tic)
+    os.makedirs(os.path.dirname(shard_dir), exist_ok=True)
+    df.to_parquet(shard_dir + '.tmp', index=False)
+    os.replace(shard_dir + '.tmp', shard_dir)
+    line = json.dumps({
+        'ticker': tic,
+        'mode': crawl_mode,
+        'records': len(df),
+        'shard': shard_dir,
+        'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }) + '\n'
+    with open('/'.join([checkpoint_dir, 'manifest.jsonl']), 'a+b') as f:
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                line = '\n' + line
+        f.write(line.encode('u8'))
+
+def compact_shards(checkpoint_dir, panel_dir=None, tic_list=None):
+    # merge the shards (of tic_list only, if given) into one panel and save
+    # it as .parquet, .csv or .xlsx according to panel_dir
+    manifest = load_manifest(checkpoint_dir)
+    if tic_list is not None:
+        manifest = {tic: manifest[tic] for tic in tic_list if tic in manifest}
+    df_list = [pd.read_parquet(entry['shard']) for entry in manifest.values()]
+    df = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame()
+    
+    if panel_dir is not None:
+        write_panel(df, panel_dir)
+    return df
+
+class CrawlBlocked(Exception):
+    pass
+
+
+def is_blocked_post_page(soup):
+    # challenge pages, and pages that are neither a post list nor the end
+    text = soup.text
+    if 'denied' in text.lower() or '确认您是人类' in text:
+        return True
+    if 'we’ve hit a bottom' in text.lower():
+        return False
+    return soup.find(name='div', attrs={'data-test-id':'post-list'}) is None
+
+
+class TickerQueues:
+    # each worker starts with a contiguous share of the tickers and takes
+    # from its front; a worker that runs dry steals from the back of the
+    # longest remaining share
+    def __init__(self, tic_list, n_workers):
+        share = -(-len(tic_list) // n_workers) if tic_list else 0
+        self.queues = [
+            deque(tic_list[worker_idx * share:(worker_idx + 1) * share])
+            for worker_idx in range(n_workers)
+            ]
+        self.n_stolen = 0
+        self.lock = threading.Lock()
+
+    def next(self, worker_idx):
+        with self.lock:
+            if self.queues[worker_idx]:
+                return self.queues[worker_idx].popleft()
+            victim = max(self.queues, key=len)
+            if not victim:
+                return None
+            self.n_stolen += 1
+            return victim.pop()
+
+
+class CrawlProgress:
+    # live counters of a parallel crawl, read with snapshot()
+    def __init__(self, n_tickers, fetcher):
+        self.n_tickers = n_tickers
+        self.fetcher = fetcher
+        self.start_fetched = fetcher.n_fetched
+        self.start_blocked = fetcher.n_blocked
+        self.tickers_done = 0
+        self.tickers_failed = 0
+        self.records = 0
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def update(self, n_records=None):
+        with self.lock:
+            if n_records is None:
+                self.tickers_failed += 1
+            else:
+                self.tickers_done += 1
+                self.records += n_records
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.start_time
+            pages = self.fetcher.n_fetched - self.start_fetched
+            finished = self.tickers_done + self.tickers_failed
+            tickers_per_sec = finished / elapsed if elapsed else 0
+            return {
+                'tickers_done': self.tickers_done,
+                'tickers_failed': self.tickers_failed,
+                'tickers_total': self.n_tickers,
+                'pages': pages,
+                'blocked_pages': self.fetcher.n_blocked - self.start_blocked,
+                'records': self.records,
+                'elapsed': elapsed,
+                'pages_per_min': pages / elapsed * 60 if elapsed else 0,
+                'eta': (self.n_tickers - finished) / tickers_per_sec if tickers_per_sec else None,
+                }
+
+    def log(self):
+        snap = self.snapshot()
+        eta = f"{snap['eta'] / 60:.1f} MIN" if snap['eta'] is not None else '?'
+        logging.info(
+            f"PROGRESS: {snap['tickers_done']}/{snap['tickers_total']} TICKERS "
+            f"({snap['tickers_failed']} FAILED), {snap['pages']} PAGES "
+            f"({snap['blocked_pages']} BLOCKED), {snap['records']} RECORDS, "
+            f"{snap['pages_per_min']:.1f} PAGES/MIN, ETA {eta}"
+            )
+
 
 class RawHTMLCrawler:
     def __init__(
             self,
             tic_list=None,
+            fetcher=None,
+            n_sessions=1,
+            pages_per_minute=None,
+            retry_policy=None,
+            known_panel_dir=None,
+            metrics=None,
+            throttle_log_dir=None,
             ):
         
+        setup_logging('crawler.log')
+        self.tic_list = tic_list
         if tic_list:
-            self.tic_list = tic_list
             self.num_tics = len(tic_list)
         else:
             logging.info('Initialised without TICs')
+        # browsers are kept alive across pages and tickers; n_sessions
+        # browsers at most, sharing one pages_per_minute budget; with
+        # throttle_log_dir, every outcome the throttle sees goes to that CSV
+        if fetcher is None:
+            rate_limiter = None
+            if pages_per_minute is not None:
+                rate_limiter = RateLimiter(pages_per_minute / 60)
+            fetcher = PageFetcher(
+                pool=DriverPool(size=n_sessions),
+                rate_limiter=rate_limiter,
+                throttle=HostThrottle(log_dir=throttle_log_dir),
+                )
+        self.fetcher = fetcher
+        if retry_policy is None:
+            retry_policy = RetryPolicy(base=30, cap=600, max_attempts=10)
+        self.retry_policy = retry_policy
+        # incremental mode: with a panel of known transcripts, only new
+        # postings are collected, and checkpoints are kept apart from
+        # those of full crawls
+        self.known_ids = load_known_ids(known_panel_dir) if known_panel_dir else {}
+        self.crawl_mode = gen_crawl_mode(known_panel_dir)
+        # backoff after blocked pages goes to 'challenge_wait', each ticker
+        # to 'crawl_ticker' with its postings as items
+        self.metrics = metrics if metrics is not None else get_metrics()
     
-    def get_art_list_single_tic(self, tic):
+    def get_art_list_single_tic(self, tic, known_ids=None):
+        with self.metrics.timer('crawl_ticker') as timer:
+            df = self.crawl_single_tic(tic, known_ids)
+            timer.n_items = len(df)
+        return df
+    
+    def crawl_single_tic(self, tic, known_ids=None):
+        # the listing is newest first, so paging stops at the first page
+        # whose transcripts are all in known_ids
+        if known_ids is None:
+            known_ids = self.known_ids.get(tic, set())
         logging.info('-'*20)
         logging.info(f'TARGET TICKER: {tic}')
         url = f'https://seekingalpha.com/symbol/{tic}/earnings/transcripts'
-        df = pd.DataFrame()
+        fields = None
         keep_on = True
         page = 1
+        n_blocked = 0
 
         # start scraping
-        driver = webdriver.Edge()
         while keep_on:
             url = f'https://seekingalpha.com/symbol/{tic}/earnings/transcripts?page={page}'
             
-            driver.get(url)
-            page_source = driver.page_source
-            soup = BeautifulSoup(page_source)
-
-            time.sleep(5)
-            if 'denied' not in soup.text.lower() and '确认您是人类' not in soup.text:
-                if 'we’ve hit a bottom' in soup.text.lower():
-                    keep_on = False
-                    driver.close()
-                else:
-                    post_list = soup.find(name='div', attrs={'data-test-id':'post-list'})
-                    if post_list is not None:
-                        tmp_art_list = list(post_list.findAll('article'))
-                        if len(tmp_art_list) != 0:
-                            tmp_df = organise_posting(art_list=tmp_art_list)
-                            df = pd.concat([df, tmp_df])
-                            logging.info('-'*page+f'PAGE {page}')
-                            page += 1
-                        else:
+            try:
+                soup = self.fetcher.fetch(
+                    url,
+                    parse=lambda page_source: BeautifulSoup(page_source, 'lxml'),
+                    is_blocked=is_blocked_post_page,
+                    )
+            except self.retry_policy.retry_errors as e:
+                logging.warning(f'{tic}: page {page} failed: {e!r}')
+                soup = None
+            if soup is None or is_blocked_post_page(soup):
+                # the fetcher has already swapped the driver; back off and
+                # try again, up to the policy's number of attempts per page
+                n_blocked += 1
+                if n_blocked >= self.retry_policy.max_attempts:
+                    raise CrawlBlocked(f'{tic}: page {page} blocked {n_blocked} times')
+                with self.metrics.timer('challenge_wait'):
+                    time.sleep(self.retry_policy.delay(n_blocked - 1))
+                continue
+            n_blocked = 0
+            
+            if 'we’ve hit a bottom' in soup.text.lower():
+                keep_on = False
+            else:
+                post_list = soup.find(name='div', attrs={'data-test-id':'post-list'})
+                tmp_art_list = list(post_list.findAll('article'))
+                if len(tmp_art_list) != 0:
+                    if known_ids:
+                        page_fields = extract_posting_fields(tmp_art_list)
+                        new_idx = [
+                            idx for idx, url in enumerate(page_fields['url'])
+                            if url_to_trans_id(url) not in known_ids
+                            ]
+                        if fields is None:
+                            fields = extract_posting_fields([])
+                        for key, value in page_fields.items():
+                            fields[key] += [value[idx] for idx in new_idx]
+                        if page_fields['url'] and not new_idx:
+                            logging.info('-'*page+f'PAGE {page}: NOTHING NEW')
                             keep_on = False
-                            driver.close()
+                            continue
                     else:
-                        driver.close()
-                        driver = webdriver.Edge()
-                        continue                
-            else:
-                driver.close()
-                driver = webdriver.Edge()
-
-                continue
+                        fields = extract_posting_fields(tmp_art_list, fields)
+                    logging.info('-'*page+f'PAGE {page}')
+                    page += 1
+                else:
+                    keep_on = False
+        # one frame per ticker, built after the last page
+        if fields is None:
+            fields = extract_posting_fields([])
+        df = gen_posting_df(fields)
         df['ticker'] = tic
         df = df.sort_values(by=['year', 'quarter']).reset_index(drop=True)
 
@@ -127,28 +369,105 @@ class RawHTMLCrawler:
 
         return df
     
-    def get_art_list_multi_tics(self, tic_list=None, tic_start=0):
+    def get_art_list_multi_tics(
+            self,
+            tic_list=None,
+            tic_start=0,
+            checkpoint_dir=None,
+            panel_dir=None,
+            ):
+        # every finished ticker is written to its own shard and recorded in
+        # the manifest, so a rerun with the same checkpoint_dir resumes
+        # where the last one stopped
         if self.tic_list:
             tic_list = self.tic_list
+        if checkpoint_dir is None:
+            checkpoint_dir = gen_checkpoint_dir(self.crawl_mode)
         num_tics = len(tic_list)
+        done = load_manifest(checkpoint_dir, self.crawl_mode)
 
         logging.info('///////// START SCRAPING ////////')
-        logging.info('#TICKERS: ', self.num_tics)
-        logging.info('START FROM: ', tic_start)
+        logging.info(f'#TICKERS: {num_tics}')
+        logging.info(f'START FROM: {tic_start}')
+        logging.info(f'ALREADY DONE: {len(set(tic_list) & set(done))}')
 
         tic_count = tic_start
-        df = pd.DataFrame()
         
         for tic in tic_list[tic_start:]:
+            tic_count += 1
+            if tic in done: continue
             
             tmp_df = self.get_art_list_single_tic(tic=tic)
-            df = pd.concat([df, tmp_df])
-            df.reset_index(drop=True, inplace=True)
-            df.to_excel(f'Raw_backup_start{tic_start}.xlsx', index=False)
+            append_shard(checkpoint_dir, tic, tmp_df, self.crawl_mode)
 
-            logging.info(f'TIC NO.{tic_count} FINISHED')
+            logging.info(f'TIC NO.{tic_count - 1} FINISHED')
             logging.info(f'#TICKERS LEFT: {num_tics - tic_count}', )
-            tic_count += 1
 
-            self.df = df
-        return df
\ No newline at end of file
+        if panel_dir is None:
+            panel_dir = '/'.join([checkpoint_dir, 'panel.parquet'])
+        df = compact_shards(checkpoint_dir, panel_dir, tic_list=tic_list)
+        self.df = df
+        return df
+
+    def crawl_parallel(
+            self,
+            tic_list=None,
+            n_workers=None,
+            checkpoint_dir=None,
+            panel_dir=None,
+            report_every=60,
+            ):
+        # n_workers tickers are crawled at once (by default one per browser
+        # in the pool) under the fetcher's shared rate limit; shards and
+        # manifest are the same as get_art_list_multi_tics, so either can
+        # resume the other
+        if self.tic_list:
+            tic_list = self.tic_list
+        if n_workers is None:
+            n_workers = self.fetcher.pool.size
+        if checkpoint_dir is None:
+            checkpoint_dir = gen_checkpoint_dir(self.crawl_mode)
+        done = load_manifest(checkpoint_dir, self.crawl_mode)
+        todo = [tic for tic in dict.fromkeys(tic_list) if tic not in done]
+        queues = TickerQueues(todo, n_workers)
+        self.progress = CrawlProgress(len(todo), self.fetcher)
+        manifest_lock = threading.Lock()
+        
+        logging.info('///////// START SCRAPING ////////')
+        logging.info(f'#TICKERS: {len(todo)} ({len(tic_list) - len(todo)} ALREADY DONE)')
+        logging.info(f'#WORKERS: {n_workers}')
+        
+        def work(worker_idx):
+            while True:
+                tic = queues.next(worker_idx)
+                if tic is None:
+                    return
+                try:
+                    tmp_df = self.get_art_list_single_tic(tic=tic)
+                except Exception:
+                    logging.exception(f'{tic} FAILED')
+                    self.progress.update(None)
+                    continue
+                with manifest_lock:
+                    append_shard(checkpoint_dir, tic, tmp_df, self.crawl_mode)
+                self.progress.update(len(tmp_df))
+        
+        workers = [
+            threading.Thread(target=work, args=(worker_idx,), daemon=True)
+            for worker_idx in range(n_workers)
+            ]
+        for worker in workers:
+            worker.start()
+        while True:
+            alive = [worker for worker in workers if worker.is_alive()]
+            if not alive:
+                break
+            alive[0].join(timeout=report_every)
+            self.progress.log()
+        logging.info(f'{queues.n_stolen} TICKERS STOLEN BETWEEN WORKERS')
+        
+        if panel_dir is None:
+            panel_dir = '/'.join([checkpoint_dir, 'panel.parquet'])
+        df = compact_shards(checkpoint_dir, panel_dir, tic_list=tic_list)
+        self.df = df
+        return df
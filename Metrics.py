@@ -0,0 +1,269 @@
+'''
+Metrics.py
+│
+├── Imports
+│   ├── os
+│   ├── json
+│   ├── time
+│   ├── bisect
+│   ├── threading
+│   └── contextmanager from contextlib
+│
+├── Functions
+│   ├── get_metrics()
+│   ├── enable_metrics(enabled=True)
+│   ├── use_metrics(metrics)
+│   └── call_with_metrics(enabled, func, *args)
+│
+└── Classes
+    ├── StageStats
+    ├── NullTimer
+    ├── StageTimer
+    │   ├── __init__(self, metrics, stage)
+    │   ├── __enter__(self)
+    │   └── __exit__(self, *exc_info)
+    │
+    └── Metrics
+        ├── __init__(self, enabled=True, buckets=DEFAULT_BUCKETS)
+        ├── timer(self, stage)
+        ├── observe(self, stage, seconds, n_bytes=0, n_items=1)
+        ├── add(self, stage, n_bytes=0, n_items=0)
+        ├── get_state(self)
+        ├── merge(self, state)
+        ├── reset(self)
+        ├── quantile(self, stats, q)
+        ├── snapshot(self)
+        ├── write_json(self, file_dir)
+        └── write_prometheus(self, file_dir, prefix='ecc')
+'''
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# upper bounds in seconds, from a cached parse to a page behind a challenge
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300,
+    )
+
+
+class StageStats:
+    __slots__ = ('bucket_counts', 'total', 'count', 'n_bytes', 'n_items')
+
+    def __init__(self, n_buckets):
+        # one count per bucket plus the +Inf bucket
+        self.bucket_counts = [0] * (n_buckets + 1)
+        self.total = 0.0
+        self.count = 0
+        self.n_bytes = 0
+        self.n_items = 0
+
+
+class NullTimer:
+    # what a disabled Metrics hands out: entering and leaving do nothing,
+    # and n_bytes / n_items set on it are dropped
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer:
+    # times the block into the stage's histogram; set n_bytes or n_items on
+    # the timer inside the block to count what the stage moved
+    __slots__ = ('metrics', 'stage', 'start_time', 'n_bytes', 'n_items')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.n_bytes = 0
+        self.n_items = 1
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(
+            self.stage, time.perf_counter() - self.start_time, self.n_bytes, self.n_items
+            )
+        return False
+
+
+class Metrics:
+    # per-stage latency histograms with bytes and items moved. A disabled
+    # instance returns NULL_TIMER from timer() and ignores observe(), so
+    # instrumented code costs one attribute check when metrics are off
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.stages = {}
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def timer(self, stage):
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, stage)
+
+    def observe(self, stage, seconds, n_bytes=0, n_items=1):
+        if not self.enabled:
+            return
+        bucket_idx = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(len(self.buckets))
+            stats.bucket_counts[bucket_idx] += 1
+            stats.total += seconds
+            stats.count += 1
+            stats.n_bytes += n_bytes
+            stats.n_items += n_items
+
+    def add(self, stage, n_bytes=0, n_items=0):
+        # bytes or items of a stage that is not timed
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(len(self.buckets))
+            stats.n_bytes += n_bytes
+            stats.n_items += n_items
+
+    def get_state(self):
+        # plain data, so that worker processes can send their stages back
+        with self.lock:
+            return {
+                stage: [list(stats.bucket_counts), stats.total, stats.count, stats.n_bytes, stats.n_items]
+                for stage, stats in self.stages.items()
+                }
+
+    def merge(self, state):
+        if not self.enabled:
+            return
+        with self.lock:
+            for stage, (bucket_counts, total, count, n_bytes, n_items) in state.items():
+                stats = self.stages.get(stage)
+                if stats is None:
+                    stats = self.stages[stage] = StageStats(len(self.buckets))
+                stats.bucket_counts = [a + b for a, b in zip(stats.bucket_counts, bucket_counts)]
+                stats.total += total
+                stats.count += count
+                stats.n_bytes += n_bytes
+                stats.n_items += n_items
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.start_time = time.time()
+
+    def quantile(self, stats, q):
+        # upper bound of the bucket holding the q-th observation
+        if stats.count == 0:
+            return None
+        rank, cumulative = q * stats.count, 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), stats.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        with self.lock:
+            stages = dict(self.stages)
+        return {
+            'elapsed': elapsed,
+            'stages': {
+                stage: {
+                    'count': stats.count,
+                    'seconds': stats.total,
+                    'mean': stats.total / stats.count if stats.count else None,
+                    'p50': self.quantile(stats, 0.5),
+                    'p95': self.quantile(stats, 0.95),
+                    'bytes': stats.n_bytes,
+                    'items': stats.n_items,
+                    'items_per_sec': stats.n_items / elapsed,
+                    'bytes_per_sec': stats.n_bytes / elapsed,
+                    }
+                for stage, stats in sorted(stages.items())
+                },
+            }
+
+    def write_json(self, file_dir):
+        with open(file_dir + '.tmp', 'w', encoding='u8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(file_dir + '.tmp', file_dir)
+
+    def write_prometheus(self, file_dir, prefix='ecc'):
+        # text exposition format, e.g. for node_exporter's textfile
+        # collector; written to a temporary file first so that a scrape
+        # never sees half a file
+        with self.lock:
+            stages = sorted(self.stages.items())
+        lines = [
+            f'# HELP {prefix}_stage_seconds Latency of each pipeline stage.',
+            f'# TYPE {prefix}_stage_seconds histogram',
+            ]
+        for stage, stats in stages:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), stats.bucket_counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {stats.total}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {stats.count}')
+        for name, attr, help_text in [
+                ('bytes', 'n_bytes', 'Bytes moved by each pipeline stage.'),
+                ('items', 'n_items', 'Items handled by each pipeline stage.'),
+                ]:
+            lines.append(f'# HELP {prefix}_stage_{name}_total {help_text}')
+            lines.append(f'# TYPE {prefix}_stage_{name}_total counter')
+            for stage, stats in stages:
+                lines.append(f'{prefix}_stage_{name}_total{{stage="{stage}"}} {getattr(stats, attr)}')
+        with open(file_dir + '.tmp', 'w', encoding='u8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(file_dir + '.tmp', file_dir)
+
+
+_metrics = Metrics(enabled=False)
+
+def get_metrics():
+    # the process-wide instance that instrumented code records into unless
+    # it was given its own; disabled until enable_metrics() is called
+    return _metrics
+
+def enable_metrics(enabled=True):
+    _metrics.enabled = enabled
+    return _metrics
+
+@contextmanager
+def use_metrics(metrics):
+    # make metrics the process-wide instance for the duration of the block
+    global _metrics
+    previous, _metrics = _metrics, metrics
+    try:
+        yield metrics
+    finally:
+        _metrics = previous
+
+def call_with_metrics(enabled, func, *args):
+    # run func in a worker process with a fresh instance and send its
+    # stages back next to the result, for the parent to merge
+    with use_metrics(Metrics(enabled=enabled)) as metrics:
+        result = func(*args)
+    return result, metrics.get_state() if enabled else {}
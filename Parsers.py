@@ -4,60 +4,124 @@ Parsers.py
 ├── Imports
 │   ├── os
 │   ├── re
-│   ├── tqdm
+│   ├── time
+│   ├── zlib
 │   ├── logging
 │   ├── pandas as pd
-│   ├── BeautifulSoup from bs4
-│   └── raw_content_dir_decoder from utils
+│   ├── tqdm from tqdm
+│   ├── BeautifulSoup, SoupStrainer from bs4
+│   ├── html as lxml_html from lxml
+│   ├── ProcessPoolExecutor from concurrent.futures
+│   ├── partial from functools
+│   ├── load_raw_content_df, gen_ticker_index, setup_logging, write_panel from utils
+│   ├── get_metrics, use_metrics, call_with_metrics from Metrics
+│   └── ParquetSpeechStore, RawPackStore, TXTExportIndex, open_raw_pack_store, open_parse_cache, PARSE_CACHE_MAX_BYTES from Stores
 │
 ├── Functions
 │   ├── find_strong_para(paras)
-│   ├── organise_single_html(html_codes)
+│   ├── extract_container(html_codes, html_parser='lxml')
+│   ├── extract_paragraphs(html_codes, html_parser='lxml')
+│   ├── get_original_size(html_codes)
+│   ├── trim_transcript_html(html_codes, html_parser='lxml')
+│   ├── retrim_file(raw_dir, html_parser='lxml')
+│   ├── retrim_files(raw_dir_list, workers=None, html_parser='lxml')
+│   ├── retrim_pack_store(raw_store_dir, trimmed_store_dir, html_parser='lxml')
+│   ├── organise_single_html(html_codes, html_parser='lxml')
+│   ├── organise_html_records(html_codes, html_parser='lxml', parse_cache=None)
+│   ├── organise_html_batch(html_codes_list, trans_id_list, html_parser='lxml', parse_cache=None)
 │   ├── convert_non_ascii(string)
 │   ├── gen_name_title_pair(participant)
 │   ├── extract_name_title_from_p(name_title_p_contents)
 │   ├── gen_start_end_idx_dict(strong_paras_idx, trans_dict)
 │   ├── gen_session_df(idx_dict, strong_paras_idx, paras, mode)
+│   ├── segment_paragraphs(paras)
+│   ├── gen_session_records(idx_dict, speaker_blocks, texts, mode)
+│   ├── gen_speech_df(speech_records, trans_id_list=None)
 │   ├── gen_part_dict(idx_dict, paras, mode)
+│   ├── organise_paragraph_records(paras)
 │   ├── organise_paragraphs(paras)
+│   ├── gen_participant_df(participant_records, trans_id_list=None)
 │   ├── gen_participant_info_df(participants_info)
+│   ├── split_txt_transcripts(lines)
+│   ├── organise_txt_records(lines)
+│   ├── iter_txt_transcripts(lines)
+│   ├── iter_txt_file(file_path)
+│   ├── organise_txt_slice(file_dir, first_call_idx, last_call_idx, tic, speech_master_dir)
 │   ├── extract_participants(file_path)
+│   ├── gen_txt_participant_df(file_path)
 │   ├── get_post_list(tree)
 │   ├── process_post(post)
+│   ├── process_post_element(post)
+│   ├── process_html_records(file)
+│   ├── gen_post_df(records)
 │   ├── process_html(file)
-│   └──
+│   ├── read_raw_html(raw_dir, raw_store_dir=None)
+│   ├── organise_single_file(raw_dir, local_file_dir, html_parser='lxml', raw_store_dir=None, parse_cache_dir=None, parse_cache_max_bytes=PARSE_CACHE_MAX_BYTES)
+│   ├── organise_file_batch(raw_dir_list, trans_id_list, year_list, tic, speech_master_dir, batch_name, html_parser='lxml', raw_store_dir=None, parse_cache_dir=None, parse_cache_max_bytes=PARSE_CACHE_MAX_BYTES)
+│   └── gen_year_list(tic_df)
 └── Classes
+    ├── SpeechRecord
+    ├── ParticipantRecord
     ├──CCHistoryOrganiser
     │  ├── __init__(self)
     │  ├── get_post_list(self, file)
+    │  ├── gen_file_list(self, history_dir)
+    │  ├── process_files(self, file_list, workers=None, chunksize=8)
+    │  └── process(self, history_dir, workers=None, chunksize=8, panel_dir=None)
     ├── HTMLContentsOrganiser
-    │   ├── __init__(self, save_master_dir, local_dir_df_dir, speech_master_dir)
+    │   ├── __init__(self, save_master_dir, local_dir_df_dir, speech_master_dir, html_parser='lxml', output_format='csv', tic_list=None, raw_store_dir=None, parse_cache_dir=None, metrics=None, parse_cache_max_bytes=PARSE_CACHE_MAX_BYTES)
+    │   ├── gen_raw_dir_list(self, tic_df)
+    │   ├── gen_tic_df(self, tic)
     │   ├── gen_local_dirs(self)
-    │   ├── process_single_tic(self, tic)
-    │   └── process(self)
+    │   ├── gen_tasks(self, tic_df, tic)
+    │   ├── gen_batches(self, tic_df, tic, chunksize)
+    │   ├── process_single_tic(self, tic, chunksize=16)
+    │   ├── log_cache_stats(self, cache_hits)
+    │   └── process(self, workers=None, chunksize=16)
     │
     └── TXTContentOrganiser
-        ├── __init__(self, save_master_dir, local_dir_df_dir, speech_master_dir)
-        └── process_single_tic(self, tic)
+        ├── __init__(self, save_master_dir, local_dir_df_dir, speech_master_dir, tic_list=None)
+        ├── gen_tic_df(self, tic)
+        ├── gen_tasks(self, tic_df, tic, slice_bytes)
+        ├── gen_call_df(self, results)
+        ├── process_single_tic(self, tic, slice_bytes=32 * 2 ** 20)
+        └── process(self, workers=None, slice_bytes=32 * 2 ** 20)
 '''
 
 import os
 import re
-import tqdm
+import time
+import zlib
 import logging
 import pandas as pd
-from bs4 import BeautifulSoup
-from utils import raw_content_dir_decoder
+from tqdm import tqdm
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import html as lxml_html
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from utils import load_raw_content_df, gen_ticker_index, setup_logging, write_panel
+from Metrics import get_metrics, use_metrics, call_with_metrics
+from Stores import ParquetSpeechStore, RawPackStore, TXTExportIndex, open_raw_pack_store, open_parse_cache, PARSE_CACHE_MAX_BYTES
 from dateutil import parser
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'parsers.log'),
-        logging.StreamHandler()
-    ]
-)
+
+class SpeechRecord:
+    __slots__ = ('speech_idx', 'name', 'speech', 'session')
+
+    def __init__(self, speech_idx, name, speech, session):
+        self.speech_idx = speech_idx
+        self.name = name
+        self.speech = speech
+        self.session = session
+
+
+class ParticipantRecord:
+    __slots__ = ('name', 'title')
+
+    def __init__(self, name, title):
+        self.name = name
+        self.title = title
+
 
 def find_strong_para(paras):
     strong_paras_idx = []
@@ -68,12 +132,163 @@ def find_strong_para(paras):
                 break
     return strong_paras_idx
 
-def organise_single_html(html_codes):
-    soup = BeautifulSoup(html_codes, 'html.parser')
-    container = soup.find('div', attrs={'data-test-id': 'content-container'})
-    paras = container.find_all('p')
+CONTAINER_ATTRS = {'data-test-id': 'content-container'}
+
+def extract_container(html_codes, html_parser='lxml'):
+    if html_parser == 'html.parser':
+        # full tree of the whole page
+        soup = BeautifulSoup(html_codes, 'html.parser')
+    else:
+        # skip the <head> and everything else before the container, then
+        # let the strainer build the container subtree only
+        marker_idx = html_codes.find('data-test-id="content-container"')
+        div_idx = html_codes.rfind('<div', 0, marker_idx) if marker_idx != -1 else -1
+        if div_idx != -1:
+            html_codes = html_codes[div_idx:]
+        soup = BeautifulSoup(
+            html_codes,
+            html_parser,
+            parse_only=SoupStrainer('div', attrs=CONTAINER_ATTRS),
+            )
+    return soup.find('div', attrs=CONTAINER_ATTRS)
+
+def extract_paragraphs(html_codes, html_parser='lxml'):
+    return extract_container(html_codes, html_parser).find_all('p')
+
+PATTERN_TITLE = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+PATTERN_ORIGINAL_SIZE = re.compile(r'<meta name="original-size" content="(\d+)">')
+
+def get_original_size(html_codes):
+    # byte size of the page before trimming, None for an untrimmed page
+    match = PATTERN_ORIGINAL_SIZE.search(html_codes, 0, 4096)
+    return int(match.group(1)) if match else None
+
+def trim_transcript_html(html_codes, html_parser='lxml'):
+    # keep the page title and the content container, which is all that the
+    # parsers read, and record the byte size of the full page; returns the
+    # page and that size. Trimmed pages and pages without a container are
+    # returned unchanged
+    original_size = get_original_size(html_codes)
+    if original_size is not None:
+        return html_codes, original_size
+    original_size = len(html_codes.encode('u8'))
+    container = extract_container(html_codes, html_parser)
+    if container is None:
+        return html_codes, original_size
+    title_match = PATTERN_TITLE.search(html_codes)
+    title = title_match.group(1) if title_match else ''
+    return (
+        '<html><head>'
+        f'<title>{title}</title>'
+        f'<meta name="original-size" content="{original_size}">'
+        f'</head><body>{container}</body></html>'
+        ), original_size
+
+def retrim_file(raw_dir, html_parser='lxml'):
+    # trim a saved page in place; returns its original and new byte sizes
+    with open(raw_dir, 'r', encoding='u8') as f:
+        html_codes = f.read()
+    trimmed, original_size = trim_transcript_html(html_codes, html_parser)
+    if trimmed is not html_codes:
+        with open(raw_dir + '.tmp', 'w', encoding='u8') as f:
+            f.write(trimmed)
+        os.replace(raw_dir + '.tmp', raw_dir)
+    return original_size, len(trimmed.encode('u8'))
+
+def retrim_files(raw_dir_list, workers=None, html_parser='lxml'):
+    # offline pass over pages saved before trimming was on
+    if workers is None or workers <= 1:
+        sizes = [retrim_file(raw_dir, html_parser) for raw_dir in tqdm(raw_dir_list)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            sizes = list(tqdm(
+                executor.map(retrim_file, raw_dir_list, [html_parser] * len(raw_dir_list), chunksize=16),
+                total=len(raw_dir_list),
+                ))
+    logging.info(
+        f'RETRIMMED {len(sizes)} FILES: {sum(size for size, _ in sizes)} -> '
+        f'{sum(size for _, size in sizes)} BYTES'
+        )
+    return sizes
+
+def retrim_pack_store(raw_store_dir, trimmed_store_dir, html_parser='lxml'):
+    # copy a RawPackStore into a new one with every page trimmed
+    source = RawPackStore(raw_store_dir)
+    target = RawPackStore(trimmed_store_dir)
+    for trans_id, html_codes in tqdm(source.iter_pages(), total=len(source)):
+        trimmed, original_size = trim_transcript_html(html_codes, html_parser)
+        target.put(trans_id, trimmed, source.index[trans_id]['ticker'], original_size)
+    source.close()
+    return target
+
+def organise_single_html(html_codes, html_parser='lxml'):
+    return organise_paragraphs(extract_paragraphs(html_codes, html_parser))
+
+# part of every parse cache key; bump it whenever a change to the parsing
+# code changes its output, so that older cached results are not reused
+PARSER_VERSION = '1'
+
+def organise_html_records(html_codes, html_parser='lxml', parse_cache=None):
+    # participant and speech records of one page, and whether they came
+    # from parse_cache (None without a cache); records are cached as plain
+    # tuples
+    metrics = get_metrics()
+    if parse_cache is not None:
+        key = parse_cache.gen_key(html_codes, f'{PARSER_VERSION}/{html_parser}')
+        with metrics.timer('cache_lookup'):
+            cached = parse_cache.get(key)
+        if cached is not None:
+            participant_tuples, speech_tuples = cached
+            return (
+                [ParticipantRecord(*values) for values in participant_tuples],
+                [SpeechRecord(*values) for values in speech_tuples],
+                True,
+                )
+    
+    with metrics.timer('parse'):
+        paras = extract_paragraphs(html_codes, html_parser)
+    with metrics.timer('segment'):
+        participant_records, speech_records = organise_paragraph_records(paras)
+    if parse_cache is None:
+        return participant_records, speech_records, None
+    parse_cache.put(key, (
+        [(record.name, record.title) for record in participant_records],
+        [(record.speech_idx, record.name, record.speech, record.session) for record in speech_records],
+        ))
+    return participant_records, speech_records, False
+
+def organise_html_batch(html_codes_list, trans_id_list, html_parser='lxml', parse_cache=None):
+    # parse a batch of transcripts and build one table of each kind for the
+    # whole batch; failed transcripts, and pages given as None because they
+    # could not be read, are flagged 0 and left out. The last item lists
+    # per transcript whether parse_cache had it
+    success, cache_hits = [], []
+    participant_records, participant_trans_ids = [], []
+    speech_records, speech_trans_ids = [], []
+    for html_codes, trans_id in zip(html_codes_list, trans_id_list):
+        if html_codes is None:
+            success.append(0)
+            cache_hits.append(False if parse_cache else None)
+            continue
+        try:
+            tmp_participants, tmp_speeches, cache_hit = organise_html_records(
+                html_codes, html_parser, parse_cache
+                )
+        except:
+            success.append(0)
+            cache_hits.append(False if parse_cache else None)
+            continue
+        success.append(1)
+        cache_hits.append(cache_hit)
+        participant_records += tmp_participants
+        participant_trans_ids += [trans_id] * len(tmp_participants)
+        speech_records += tmp_speeches
+        speech_trans_ids += [trans_id] * len(tmp_speeches)
     
-    return organise_paragraphs(paras)
+    participant_df = gen_participant_df(participant_records, participant_trans_ids)
+    speech_df = gen_speech_df(speech_records, speech_trans_ids)
+    
+    return success, participant_df, speech_df, cache_hits
 
 def convert_non_ascii(string):
     return re.sub(r'[^\x00-\x7F]+', '-', string)
@@ -199,6 +414,130 @@ def gen_session_df(idx_dict,strong_paras_idx, paras, mode):
     
     return session_df
 
+def segment_paragraphs(paras):
+    # single pass over the paragraphs: speaker headers (<p> with a <strong>),
+    # section labels and speech blocks are collected together, so the
+    # paragraph list is never rescanned
+    texts = []
+    strong_paras_idx = []
+    first_strong = {}
+    labels_seen = set()
+    after_strong = {}
+    speaker_blocks = []
+
+    for p_i, p in enumerate(paras):
+        text = p.text
+        texts.append(text)
+        label = text.strip().lower()
+        labels_seen.add(label)
+        if p.find(lambda tag: 'strong' in tag.name) is None:
+            continue
+        
+        # the strong para right after a section header closes that section
+        for header in ('analysts', 'conference call participants'):
+            if header in first_strong and header not in after_strong:
+                after_strong[header] = p_i
+        for header in ('operator', 'participants', 'analysts',
+                       'conference call participants',
+                       'question-and-answer session'):
+            if label == header and header not in first_strong:
+                first_strong[header] = p_i
+        if 'company' not in first_strong and ('company' in label or 'corporate' in label):
+            first_strong['company'] = p_i
+        
+        # close the previous speaker block and open a new one
+        if speaker_blocks:
+            speaker_blocks[-1][2] = p_i
+        speaker_blocks.append([p_i, text.split('-')[-1].strip(), len(paras)])
+        strong_paras_idx.append(p_i)
+
+    def first(header):
+        if header not in first_strong:
+            raise ValueError(f'No "{header}" header found')
+        return first_strong[header]
+
+    def section_end(header):
+        if header not in after_strong:
+            raise ValueError(f'No header after "{header}" found')
+        return after_strong[header]
+
+    # get MD start index
+    if 'operator' in labels_seen:
+        md_start_idx = first('operator')
+    elif 'analysts' in labels_seen or 'conference call participants' in labels_seen:
+        md_start_idx = strong_paras_idx[2]
+    else:
+        md_start_idx = strong_paras_idx[1]
+
+    # get company participants and analysts start and end indices
+    if 'analysts' in labels_seen:
+        comp_part_start_idx = first('participants')
+        confcall_part_start_idx = first('analysts')
+        confcall_part_end_idx = section_end('analysts')
+        comp_part_end_idx = confcall_part_start_idx
+    else:
+        comp_part_start_idx = first('company')
+        if 'conference call participants' in labels_seen:
+            confcall_part_start_idx = first('conference call participants')
+            confcall_part_end_idx = section_end('conference call participants')
+            comp_part_end_idx = confcall_part_start_idx
+        else:
+            confcall_part_start_idx, confcall_part_end_idx = None, None
+            comp_part_end_idx = md_start_idx
+
+    if 'question-and-answer session' in labels_seen:
+        md_end_idx = first('question-and-answer session')
+        qa_start_idx = md_end_idx + 1
+        qa_end_idx = len(paras) - 1
+    else:
+        md_end_idx = len(paras) - 1
+        qa_start_idx, qa_end_idx = None, None
+
+    idx_dict = {
+        'company start': comp_part_start_idx,
+        'company end': comp_part_end_idx,
+        'others start': confcall_part_start_idx,
+        'others end': confcall_part_end_idx,
+        'md start': md_start_idx,
+        'md end': md_end_idx,
+        'qa start': qa_start_idx,
+        'qa end': qa_end_idx,
+        }
+    
+    return texts, idx_dict, speaker_blocks
+
+def gen_session_records(idx_dict, speaker_blocks, texts, mode):
+    # speeches of the blocks whose header falls in [start, end), cut at end
+    start_idx, end_idx = idx_dict[f'{mode} start'], idx_dict[f'{mode} end']
+    if start_idx is None:
+        return []
+    
+    session = mode.upper()
+    records = []
+    for header_idx, person, block_end_idx in speaker_blocks:
+        if header_idx < start_idx:
+            continue
+        if header_idx >= end_idx:
+            break
+        for idx in range(header_idx + 1, min(block_end_idx, end_idx)):
+            records.append(SpeechRecord(idx, person, texts[idx], session))
+    
+    return records
+
+def gen_speech_df(speech_records, trans_id_list=None):
+    # build the speech table in one go from the records, column by column
+    speech_idx_list = [record.speech_idx for record in speech_records]
+    columns = {
+        'speech_idx': speech_idx_list,
+        'name': [record.name for record in speech_records],
+        'speech': [record.speech for record in speech_records],
+        'session': [record.session for record in speech_records],
+        }
+    if trans_id_list is not None:
+        columns = {'trans_id': trans_id_list, **columns}
+    
+    return pd.DataFrame(columns, index=speech_idx_list)
+
 def gen_part_dict(idx_dict, paras, mode):
     # get company or conference call participants dict
     part_start_idx, part_end_idx = idx_dict[f'{mode} start'], idx_dict[f'{mode} end']
@@ -221,56 +560,207 @@ def gen_part_dict(idx_dict, paras, mode):
 
         return participants_info
 
-def organise_paragraphs(paras):
-    strong_paras_idx = find_strong_para(paras)            
-    trans_dict = dict(
-        [(para_idx, para.text.strip()) for para_idx, para in enumerate(paras)]
-        )
-    participants_info = {}
-    idx_dict = gen_start_end_idx_dict(strong_paras_idx, trans_dict)
+def organise_paragraph_records(paras):
+    texts, idx_dict, speaker_blocks = segment_paragraphs(paras)
 
-    # get participants info df
+    # get participants info
     participants_info = {}
     for mode in ['company', 'others']:
         for name, title in gen_part_dict(idx_dict, paras, mode=mode).items():
             participants_info[name] = title
-    participant_df = gen_participant_info_df(participants_info)
+    participant_records = [
+        ParticipantRecord(name, title)
+        for name, title in participants_info.items()
+        ]
     
-    # get session dfs
-    md_session_df = gen_session_df(idx_dict, strong_paras_idx, paras, mode='md')
-    qa_session_df = gen_session_df(idx_dict, strong_paras_idx, paras, mode='qa')
-    speech_df = pd.concat([md_session_df, qa_session_df])
+    # get session records
+    speech_records = []
+    for mode in ['md', 'qa']:
+        speech_records += gen_session_records(idx_dict, speaker_blocks, texts, mode)
     
-    return participant_df, speech_df
+    return participant_records, speech_records
 
-def gen_participant_info_df(participants_info):       
-    p_info_df = pd.DataFrame(
-        columns=['name', 'title/affiliation']
-        )
-    p_info_df_idx = 0
-    for name, title in participants_info.items():
-        p_info_df.loc[p_info_df_idx, 'name'] = name
-        p_info_df.loc[p_info_df_idx, 'title/affiliation'] = title
-        p_info_df_idx += 1
+def organise_paragraphs(paras):
+    participant_records, speech_records = organise_paragraph_records(paras)
+    
+    return gen_participant_df(participant_records), gen_speech_df(speech_records)
+
+def gen_participant_df(participant_records, trans_id_list=None):
+    columns = {
+        'name': [record.name for record in participant_records],
+        'title/affiliation': [record.title for record in participant_records],
+        }
+    if trans_id_list is not None:
+        columns = {'trans_id': trans_id_list, **columns}
     
-    return p_info_df
+    return pd.DataFrame(columns)
+
+def gen_participant_info_df(participants_info):
+    return gen_participant_df([
+        ParticipantRecord(name, title)
+        for name, title in participants_info.items()
+        ])
+
+# LSEG (StreetEvents) text exports: a banner line opens every transcript,
+# '=' rules frame the section headings and '-' rules frame each speaker
+PATTERN_TXT_BANNER = re.compile(r'StreetEvents Event Transcript\s*$')
+PATTERN_TXT_RULE = re.compile(r'^\s*(?:={10,}|-{10,})\s*$')
+PATTERN_TXT_SPEAKER = re.compile(r'^(.*?)\s*\[\d+\]\s*$')
+PATTERN_TXT_SPACED = re.compile(r'^(?:\S ){3,}')
+TXT_SECTIONS = {
+    'corporate participants': 'company',
+    # the exports spell it both ways
+    'conference call participants': 'others',
+    'conference call participiants': 'others',
+    'presentation': 'md',
+    'questions and answers': 'qa',
+    'definitions': 'end',
+    'disclaimer': 'end',
+    }
+
+def split_txt_transcripts(lines):
+    # group the lines of an export into one list per transcript; only one
+    # transcript is held at a time, so a multi-GB export streams through.
+    # Lines before the first banner go with the first transcript, as in
+    # TXTExportIndex
+    transcript_lines, seen_banner = [], False
+    for line in lines:
+        if PATTERN_TXT_BANNER.search(line):
+            if seen_banner:
+                yield transcript_lines
+                transcript_lines = []
+            seen_banner = True
+        transcript_lines.append(line)
+    if any(line.strip() for line in transcript_lines):
+        yield transcript_lines
+
+def organise_txt_records(lines):
+    # participants and MD / Q&A speeches of one transcript, as the records
+    # organise_paragraph_records gives for a page; speech_idx counts the
+    # paragraphs of the transcript
+    header, participants_info, speech_records = [], {}, []
+    section, after_rule, speaker, person, paragraph = 'header', False, None, None, []
+
+    def close_paragraph():
+        if paragraph and speaker is not None and section in ('md', 'qa'):
+            speech_records.append(SpeechRecord(
+                len(speech_records), speaker, ' '.join(paragraph), section.upper()
+                ))
+        paragraph.clear()
+
+    for line in lines:
+        text = line.strip()
+        if PATTERN_TXT_RULE.match(text):
+            close_paragraph()
+            after_rule = True
+            continue
+        if not text:
+            close_paragraph()
+            continue
+
+        if after_rule:
+            after_rule = False
+            label = text.lower()
+            if label in TXT_SECTIONS:
+                section, speaker = TXT_SECTIONS[label], None
+                continue
+            match = PATTERN_TXT_SPEAKER.match(text)
+            if match and section in ('md', 'qa'):
+                # "Name,  Company - Title   [n]", or just "Operator   [n]"
+                speaker = convert_non_ascii(match.group(1).split(',')[0]).strip()
+                continue
+
+        if section == 'header':
+            if PATTERN_TXT_BANNER.search(text):
+                # anything before the banner is not the title
+                header.clear()
+            elif not PATTERN_TXT_SPACED.match(text):
+                header.append(text)
+        elif section in ('company', 'others'):
+            # " * Name" followed by "   Company - Title"
+            if text.startswith('*'):
+                person = convert_non_ascii(text.lstrip('* ')).strip()
+                participants_info[person] = None
+            elif person is not None:
+                participants_info[person] = convert_non_ascii(text).strip()
+                person = None
+        elif section in ('md', 'qa'):
+            paragraph.append(text)
+    close_paragraph()
+
+    participant_records = [
+        ParticipantRecord(name, title)
+        for name, title in participants_info.items()
+        ]
+    header_info = {
+        'title': header[0] if header else None,
+        'date': header[1] if len(header) > 1 else None,
+        }
+    return header_info, participant_records, speech_records
+
+def iter_txt_transcripts(lines):
+    # (header_info, participant_records, speech_records) of every
+    # transcript in the lines of an export, one at a time
+    for transcript_lines in split_txt_transcripts(lines):
+        yield organise_txt_records(transcript_lines)
+
+def iter_txt_file(file_path):
+    # (call_idx, header_info, participant_df, speech_df) of every transcript
+    # in an export file, reading it line by line
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for call_idx, (header_info, participant_records, speech_records) in enumerate(
+                iter_txt_transcripts(f)
+                ):
+            yield call_idx, header_info, gen_participant_df(participant_records), gen_speech_df(speech_records)
+
+def organise_txt_slice(file_dir, first_call_idx, last_call_idx, tic, speech_master_dir):
+    # parse transcripts first_call_idx to last_call_idx - 1 of an export,
+    # read by offset through its TXTExportIndex, and write their tables to
+    # <speech_master_dir>/<tic>/<file name>_<call_idx>; kept at module
+    # level so that it can be shipped to worker processes. Returns one row
+    # per transcript
+    index = TXTExportIndex(file_dir)
+    file_name = os.path.splitext(os.path.basename(file_dir))[0]
+    call_rows = []
+    try:
+        for call_idx in range(first_call_idx, last_call_idx):
+            header_info, participant_records, speech_records = organise_txt_records(
+                index.read(call_idx).splitlines()
+                )
+            local_file_dir = '/'.join([speech_master_dir, tic, f'{file_name}_{call_idx}'])
+            os.makedirs(local_file_dir, exist_ok=True)
+            gen_participant_df(participant_records).to_csv(
+                local_file_dir + '/participant_info.csv', index=False, encoding='u8'
+                )
+            gen_speech_df(speech_records).to_csv(
+                local_file_dir + '/speech.csv', index=False, encoding='u8'
+                )
+            call_rows.append({
+                'ticker': tic,
+                'local_dir': file_dir,
+                'call_idx': call_idx,
+                **header_info,
+                'n_speeches': len(speech_records),
+                'cleaned_dir': local_file_dir,
+                })
+    finally:
+        index.close()
+    return call_rows
 
 def extract_participants(file_path):
     participants = []
     with open(file_path, 'r') as file:
-        lines = file.readlines()
-        
         # Flag to indicate if we are in the participants section
         in_participants_section = False
         
-        for line in lines:
+        for line in file:
             line = line.strip()
             # Check for the start of the Corporate Participants section
             if line == "Corporate Participants":
                 in_participants_section = True
                 continue
-            # Check for the end of the participants section
-            if line == "Conference Call Participiants":
+            # Check for the end of the participants section (either spelling)
+            if line in ("Conference Call Participants", "Conference Call Participiants"):
                 in_participants_section = False
                 continue
             # If we are in the participants section, extract names and titles
@@ -279,6 +769,15 @@ def extract_participants(file_path):
     
     return participants
 
+def gen_txt_participant_df(file_path):
+    # participants of every transcript in an export file, both blocks, as
+    # a frame of name and title
+    participant_records = []
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for _, tmp_participants, _ in iter_txt_transcripts(f):
+            participant_records += tmp_participants
+    return gen_participant_df(participant_records)
+
 def get_post_list(tree):
     return tree.find('div', attrs={'data-test-id':'post-list'}).find_all('article')
 
@@ -309,30 +808,196 @@ def process_post(post):
         'date': post_date,
         }
 
-def process_html(file):
+POST_COLUMNS = ['ticker', 'ID', 'date', 'title', 'url', 'filename']
+
+def process_post_element(post):
+    # process_post for an lxml <article>, with the date left as shown on
+    # the page for gen_post_df to parse with the others
+    h3 = post.xpath('.//h3')[0]
+    url = h3.xpath('.//a/@data-savepage-href')[0].split('#source')[0]
+    ticker = post.xpath('.//footer//a[@data-test-id="post-list-ticker"]')
+    post_date = post.xpath('.//footer//span[@data-test-id="post-list-date"]')[0]
+    return (
+        ticker[0].text_content() if ticker else 'missing',
+        int(url.split('-')[0].replace('/article/', '').strip()),
+        post_date.text_content(),
+        h3.text_content(),
+        url,
+        )
+
+def process_html_records(file):
+    # posts of one saved history page as tuples in POST_COLUMNS order; kept
+    # at module level so that it can be shipped to worker processes. A page
+    # without a post list gives no posts, a malformed post is skipped
     with open(file, 'r', encoding='u8') as f:
-        content = f.read()
-    
-    tree = BS(content, features="lxml")
-    post_list = get_post_list(tree)
-    post_df = pd.DataFrame(
-        columns=['ticker', 'ID', 'date', 'title', 'url', 'filename'],
-        index=range(len(post_list))
+        tree = lxml_html.document_fromstring(f.read())
+    post_list = tree.xpath('//div[@data-test-id="post-list"]//article')
+    if not post_list:
+        logging.warning(f'NO POST LIST IN {file}')
+    records = []
+    for post in post_list:
+        try:
+            records.append(process_post_element(post) + (file,))
+        except (IndexError, ValueError):
+            logging.warning(f'MALFORMED POST IN {file}')
+    return records
+
+def gen_post_df(records):
+    # one frame from the records of any number of pages; dates are parsed
+    # in one pass, and a date that cannot be parsed is kept as shown
+    post_df = pd.DataFrame.from_records(records, columns=POST_COLUMNS)
+    post_date = pd.to_datetime(post_df['date'], format='mixed', errors='coerce')
+    # a date without a year (recent posts) comes out in year 1, where
+    # dateutil, as in process_post, takes the current year; the few
+    # distinct strings like that are parsed one by one
+    redo = post_date.isna() | (post_date.dt.year < 1900)
+    fixed = {}
+    for value in post_df.loc[redo, 'date'].unique():
+        try:
+            fixed[value] = parser.parse(value)
+        except (ValueError, OverflowError):
+            pass
+    post_date = post_date.where(~redo, pd.to_datetime(post_df['date'].map(fixed)))
+    post_df['date'] = post_date.dt.strftime('%Y-%m-%d').where(post_date.notna(), post_df['date'])
+    return post_df
+
+def process_html(file):
+    return gen_post_df(process_html_records(file))
+
+def read_raw_html(raw_dir, raw_store_dir=None):
+    # raw_dir is a file path, or the trans_id of a page in a RawPackStore
+    with get_metrics().timer('read') as timer:
+        if raw_store_dir is not None:
+            store = open_raw_pack_store(raw_store_dir)
+            html_codes = store.get(raw_dir)
+            timer.n_bytes = store.index[str(raw_dir)]['length']
+        else:
+            with open(raw_dir, 'r', encoding='u8') as f:
+                html_codes = f.read()
+                timer.n_bytes = os.fstat(f.fileno()).st_size
+    return html_codes
+
+def organise_single_file(raw_dir, local_file_dir, html_parser='lxml', raw_store_dir=None, parse_cache_dir=None, parse_cache_max_bytes=PARSE_CACHE_MAX_BYTES):
+    # parse one saved transcript and write its tables; kept at module level
+    # so that it can be shipped to worker processes. Returns the success
+    # flag, the output folder and whether the parse cache had the page; a
+    # page that cannot be read fails on its own instead of the whole pool
+    parse_cache = open_parse_cache(parse_cache_dir, parse_cache_max_bytes) if parse_cache_dir else None
+    try:
+        html = read_raw_html(raw_dir, raw_store_dir)
+    except (OSError, KeyError, zlib.error, UnicodeDecodeError) as e:
+        logging.warning(f'{raw_dir} FAILED TO READ: {e!r}')
+        return 0, None, False if parse_cache else None
+    try:
+        participant_records, speech_records, cache_hit = organise_html_records(
+            html, html_parser, parse_cache
+            )
+        p_info_df = gen_participant_df(participant_records)
+        speech_df = gen_speech_df(speech_records)
+        with get_metrics().timer('write'):
+            os.makedirs(local_file_dir, exist_ok=True)
+            p_info_df.to_csv(local_file_dir + '/participant_info.csv', index=False, encoding='u8')
+            speech_df.to_csv(local_file_dir + '/speech.csv', index=False, encoding='u8')
+        return 1, local_file_dir, cache_hit
+    except:
+        return 0, None, False if parse_cache else None
+
+def organise_file_batch(
+        raw_dir_list,
+        trans_id_list,
+        year_list,
+        tic,
+        speech_master_dir,
+        batch_name,
+        html_parser='lxml',
+        raw_store_dir=None,
+        parse_cache_dir=None,
+        parse_cache_max_bytes=PARSE_CACHE_MAX_BYTES,
+        ):
+    # parse a chunk of one ticker's transcripts and append them to the
+    # parquet store as a single batch; a page that cannot be read is
+    # flagged 0 and the rest of the batch goes on
+    html_codes_list = []
+    for raw_dir in raw_dir_list:
+        try:
+            html_codes_list.append(read_raw_html(raw_dir, raw_store_dir))
+        except (OSError, KeyError, zlib.error, UnicodeDecodeError) as e:
+            logging.warning(f'{raw_dir} FAILED TO READ: {e!r}')
+            html_codes_list.append(None)
+    parse_cache = open_parse_cache(parse_cache_dir, parse_cache_max_bytes) if parse_cache_dir else None
+    success, participant_df, speech_df, cache_hits = organise_html_batch(
+        html_codes_list, trans_id_list, html_parser, parse_cache
         )
+    store = ParquetSpeechStore(speech_master_dir)
+    with get_metrics().timer('write') as timer:
+        store.append(
+            participant_df,
+            speech_df,
+            tic,
+            dict(zip([str(trans_id) for trans_id in trans_id_list], year_list)),
+            batch_name,
+            )
+        timer.n_items = sum(success)
     
-    for idx in post_df.index:
-        for key, item in process_post(post_list[idx]).items():
-            post_df.loc[idx, key] = item
-    
-    post_df['filename'] = file
+    return [
+        (flag, store.partition_dir('speech', tic, year) if flag else None, cache_hit)
+        for flag, year, cache_hit in zip(success, year_list, cache_hits)
+        ]
+
+def gen_year_list(tic_df):
+    # year partition of each transcript: the panel's year column if any,
+    # else the post date; 0 when neither can be read
+    if 'year' in tic_df.columns:
+        year = pd.to_numeric(tic_df['year'], errors='coerce')
+    else:
+        year = pd.to_datetime(tic_df['date'], errors='coerce').dt.year
+    return year.fillna(0).astype(int).to_list()
 
 class CCHistoryOrganiser:
     def __init__(self):
-        pass
+        setup_logging('parsers.log')
 
     def get_post_list(self, file):
         return process_html(file)
 
+    def gen_file_list(self, history_dir):
+        return sorted(
+            os.path.join(history_dir, file) for file in os.listdir(history_dir)
+            if file.lower().endswith(('.html', '.htm'))
+            )
+
+    def process_files(self, file_list, workers=None, chunksize=8):
+        # pages are parsed across the pool and the posts of all of them go
+        # into one panel; a transcript listed on several overlapping pages
+        # is kept once, preferring a post that shows its ticker
+        if workers is None or workers <= 1:
+            results = [process_html_records(file) for file in tqdm(file_list)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(tqdm(
+                    executor.map(process_html_records, file_list, chunksize=chunksize),
+                    total=len(file_list),
+                    ))
+        post_df = gen_post_df([record for records in results for record in records])
+        n_posts = len(post_df)
+        post_df = post_df.iloc[
+            (post_df['ticker'] == 'missing').argsort(kind='stable')
+            ].drop_duplicates(subset='ID').sort_index().reset_index(drop=True)
+        logging.info(
+            f'{len(post_df)} TRANSCRIPTS FROM {len(file_list)} PAGES '
+            f'({n_posts - len(post_df)} DUPLICATES DROPPED)'
+            )
+        self.post_df = post_df
+        return post_df
+
+    def process(self, history_dir, workers=None, chunksize=8, panel_dir=None):
+        # every .html page saved in history_dir; with panel_dir, the panel
+        # is saved as .parquet, .csv or .xlsx
+        post_df = self.process_files(self.gen_file_list(history_dir), workers, chunksize)
+        if panel_dir is not None:
+            write_panel(post_df, panel_dir)
+        return post_df
+
 
 class HTMLContentsOrganiser:
     def __init__(
@@ -340,15 +1005,46 @@ class HTMLContentsOrganiser:
             save_master_dir,
             local_dir_df_dir,
             speech_master_dir,
+            html_parser='lxml',
+            output_format='csv',
+            tic_list=None,
+            raw_store_dir=None,
+            parse_cache_dir=None,
+            metrics=None,
+            parse_cache_max_bytes=PARSE_CACHE_MAX_BYTES,
             ):
+        setup_logging('parsers.log')
         self.save_master_dir = save_master_dir
-        decoder = raw_content_dir_decoder(local_dir_df_dir)
-        self.local_dir_df = decoder(local_dir_df_dir)
+        # a worker given tic_list only loads the rows of its own tickers
+        self.local_dir_df = load_raw_content_df(local_dir_df_dir, tic_list)
+        self.tic_idx = gen_ticker_index(self.local_dir_df)
         self.speech_master_dir = speech_master_dir
+        self.html_parser = html_parser
+        # 'csv': a folder per transcript; 'parquet': a ParquetSpeechStore
+        self.output_format = output_format
+        # with raw_store_dir, pages are read by trans_id from a RawPackStore
+        self.raw_store_dir = raw_store_dir
+        # with parse_cache_dir, a page parsed before with the same
+        # PARSER_VERSION is read back from a ParseCache instead; each
+        # worker keeps it under parse_cache_max_bytes on its own count
+        self.parse_cache_dir = parse_cache_dir
+        self.parse_cache_max_bytes = parse_cache_max_bytes
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        # 'read', 'parse', 'segment', 'cache_lookup' and 'write' stages, from
+        # worker processes too
+        self.metrics = metrics if metrics is not None else get_metrics()
+    
+    def gen_raw_dir_list(self, tic_df):
+        if self.raw_store_dir is not None:
+            return tic_df['trans_id'].astype(str).to_list()
+        return tic_df['local_dir'].to_list()
+    
+    def gen_tic_df(self, tic):
+        return self.local_dir_df.iloc[self.tic_idx.get(tic, [])]
     
     def gen_local_dirs(self):
-        for tic in tqdm(self.local_dir_df['tic'].drop_duplicates().to_list()):
-            tic_df = self.local_dir_df[self.local_dir_df['tic'] == tic]
+        for tic in tqdm(self.local_dir_df['ticker'].drop_duplicates().to_list()):
+            tic_df = self.gen_tic_df(tic)
             local_folder_dir = '/'.join(
                 [self.save_master_dir, tic]
                 )
@@ -368,68 +1064,224 @@ class HTMLContentsOrganiser:
                     local_dir_list.append(local_dir)
                     saved_idx_list.append(idx)
             
-            self.local_dir_df.loc[saved_idx_list, 'raw_dir'] = local_dir_list
-        
-    def process_single_tic(self, tic):
-        tic_df = self.local_dir_df[self.local_dir_df['ticker'] == tic]
+            self.local_dir_df.loc[saved_idx_list, 'local_dir'] = local_dir_list
+
+    def gen_tasks(self, tic_df, tic):
         local_folder_dir = '/'.join(
             [self.speech_master_dir, tic]
             )
         os.makedirs(local_folder_dir, exist_ok=True)
+        raw_dir_list = self.gen_raw_dir_list(tic_df)
+        local_file_dir_list = [
+            local_folder_dir + '/' + title
+            for title in tic_df['title']
+            ]
+        return raw_dir_list, local_file_dir_list
+
+    def gen_batches(self, tic_df, tic, chunksize):
+        year_list = gen_year_list(tic_df)
+        batches = []
+        for start in range(0, len(tic_df), chunksize):
+            chunk_df = tic_df.iloc[start:start + chunksize]
+            batches.append((
+                list(chunk_df.index),
+                (
+                    self.gen_raw_dir_list(chunk_df),
+                    chunk_df['trans_id'].to_list(),
+                    year_list[start:start + chunksize],
+                    tic,
+                    self.speech_master_dir,
+                    f'{tic}-{chunk_df.index[0]}',
+                    self.html_parser,
+                    self.raw_store_dir,
+                    self.parse_cache_dir,
+                    self.parse_cache_max_bytes,
+                    ),
+                ))
+        return batches
+        
+    def process_single_tic(self, tic, chunksize=16):
+        tic_df = self.gen_tic_df(tic)
         success = []
         success_dir_list = []
+        cache_hits = []
 
         logging.info(f'{len(tic_df)} FILES IN TOTAL')
-        for idx in tic_df.index:
-            raw_dir = tic_df.loc[idx, 'local_dir']
-            title = tic_df.loc[idx, 'title']            
-            with open(raw_dir, 'r', encoding='u8') as f:
-                html = f.read()
-            try:
-                p_info_df, speech_df = organise_single_html(html)
-                success.append(1)
-                local_file_dir = local_folder_dir + '/' + title
-                os.makedirs(local_file_dir, exist_ok=True)        
-                p_info_df.to_csv(local_file_dir + '/participant_info.csv', index=False, encoding='u8')
-                speech_df.to_csv(local_file_dir + '/speech.csv', index=False, encoding='u8')
-                success_dir_list.append(local_file_dir)
-            except:
-                success.append(0)
-                success_dir_list.append(None)
+        if self.output_format == 'parquet':
+            ParquetSpeechStore(self.speech_master_dir).clear(tic)
+            for _, args in self.gen_batches(tic_df, tic, chunksize):
+                for flag, cleaned_dir, cache_hit in organise_file_batch(*args):
+                    success.append(flag)
+                    success_dir_list.append(cleaned_dir)
+                    cache_hits.append(cache_hit)
+        else:
+            raw_dir_list, local_file_dir_list = self.gen_tasks(tic_df, tic)
+            for raw_dir, local_file_dir in zip(raw_dir_list, local_file_dir_list):
+                flag, cleaned_dir, cache_hit = organise_single_file(
+                    raw_dir, local_file_dir, self.html_parser, self.raw_store_dir,
+                    self.parse_cache_dir, self.parse_cache_max_bytes,
+                    )
+                success.append(flag)
+                success_dir_list.append(cleaned_dir)
+                cache_hits.append(cache_hit)
+        self.log_cache_stats(cache_hits)
         return success, success_dir_list
     
-    def process(self):
-        self.local_dir_df.dropna(subset=['raw_dir'],inplace=True)
-        tic_list = self.local_dir_df['tic'].drop_duplicates().to_list()
-
-        for tic in tqdm(tic_list):
-            success, success_dir_list = self.process_single_tic(tic)
-            self.local_dir_df.loc[
-                self.local_dir_df['tic'] == tic,
-                'success'
-                ] = success
-            self.local_dir_df.loc[
-                self.local_dir_df['tic'] == tic,
-                'cleaned_dir'
-                ] = success_dir_list
+    def log_cache_stats(self, cache_hits):
+        if self.parse_cache_dir is None:
+            return
+        n_hits = sum(bool(cache_hit) for cache_hit in cache_hits)
+        self.cache_stats['hits'] += n_hits
+        self.cache_stats['misses'] += len(cache_hits) - n_hits
+        logging.info(f'PARSE CACHE: {n_hits} HITS, {len(cache_hits) - n_hits} MISSES')
+    
+    def process(self, workers=None, chunksize=16):
+        if self.raw_store_dir is not None:
+            store = open_raw_pack_store(self.raw_store_dir)
+            store.refresh()
+            self.local_dir_df = self.local_dir_df[
+                self.local_dir_df['trans_id'].astype(str).map(store.__contains__)
+                ].copy()
+        else:
+            self.local_dir_df.dropna(subset=['local_dir'],inplace=True)
+        self.tic_idx = gen_ticker_index(self.local_dir_df)
+        tic_list = self.local_dir_df['ticker'].drop_duplicates().to_list()
+
+        if workers is None or workers <= 1:
+            with use_metrics(self.metrics):
+                for tic in tqdm(tic_list):
+                    tic_index = self.gen_tic_df(tic).index
+                    success, success_dir_list = self.process_single_tic(tic, chunksize)
+                    self.local_dir_df.loc[tic_index, 'success'] = success
+                    self.local_dir_df.loc[tic_index, 'cleaned_dir'] = success_dir_list
+            return
+        
+        # fan files of all tickers out to the pool; results come back in
+        # submission order, so they can be written back by index
+        idx_list, task_list = [], []
+        for tic in tic_list:
+            tic_df = self.gen_tic_df(tic)
+            if self.output_format == 'parquet':
+                ParquetSpeechStore(self.speech_master_dir).clear(tic)
+                for batch_idx_list, args in self.gen_batches(tic_df, tic, chunksize):
+                    idx_list += batch_idx_list
+                    task_list.append(args)
+            else:
+                tmp_raw_dirs, tmp_local_file_dirs = self.gen_tasks(tic_df, tic)
+                idx_list += list(tic_df.index)
+                task_list += [
+                    (
+                        raw_dir, local_file_dir, self.html_parser, self.raw_store_dir,
+                        self.parse_cache_dir, self.parse_cache_max_bytes,
+                        )
+                    for raw_dir, local_file_dir in zip(tmp_raw_dirs, tmp_local_file_dirs)
+                    ]
+        if len(task_list) == 0:
+            return
+        
+        if self.output_format == 'parquet':
+            # tasks are already chunked into batches
+            func, map_chunksize = organise_file_batch, 1
+        else:
+            func, map_chunksize = organise_single_file, chunksize
+        
+        logging.info(f'{len(idx_list)} FILES IN TOTAL, {workers} WORKERS')
+        start_time = time.perf_counter()
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result, state in tqdm(
+                    executor.map(
+                        partial(call_with_metrics, self.metrics.enabled, func),
+                        *zip(*task_list),
+                        chunksize=map_chunksize,
+                        ),
+                    total=len(task_list),
+                    ):
+                results.append(result)
+                self.metrics.merge(state)
+        elapsed = time.perf_counter() - start_time
+        if self.output_format == 'parquet':
+            results = [result for batch in results for result in batch]
+        
+        self.local_dir_df.loc[idx_list, 'success'] = [flag for flag, _, _ in results]
+        self.local_dir_df.loc[idx_list, 'cleaned_dir'] = [cleaned_dir for _, cleaned_dir, _ in results]
+        self.log_cache_stats([cache_hit for _, _, cache_hit in results])
+        logging.info(
+            f'{len(idx_list)} FILES IN {elapsed:.1f}s '
+            f'({len(idx_list) / max(elapsed, 1e-9):.1f} FILES/SEC)'
+            )
             
 
 class TXTContentOrganiser:
-    def __inti__(self,
+    def __init__(
+            self,
             save_master_dir,
             local_dir_df_dir,
             speech_master_dir,
+            tic_list=None,
             ):
+        setup_logging('parsers.log')
         self.save_master_dir = save_master_dir
-        decoder = raw_content_dir_decoder(local_dir_df_dir)
-        self.local_dir_df = decoder(local_dir_df_dir)
+        # one row per export file: ticker and local_dir; a file may hold
+        # many transcripts
+        self.local_dir_df = load_raw_content_df(local_dir_df_dir, tic_list)
+        self.tic_idx = gen_ticker_index(self.local_dir_df)
         self.speech_master_dir = speech_master_dir
     
-    def process_single_tic(self, tic):
-        tic_df = self.local_dir_df[self.local_dir_df['ticker'] == tic]
-        local_folder_dir = '/'.join(
-            [self.speech_master_dir, tic]
+    def gen_tic_df(self, tic):
+        return self.local_dir_df.iloc[self.tic_idx.get(tic, [])]
+    
+    def gen_tasks(self, tic_df, tic, slice_bytes):
+        # slices of the ticker's exports; indexing an export the first time
+        # is one pass over it, later runs read the offsets from the sidecar
+        tasks = []
+        for local_dir in tic_df['local_dir'].dropna():
+            try:
+                index = TXTExportIndex(local_dir)
+            except OSError:
+                logging.exception(f'{local_dir} FAILED')
+                continue
+            index.close()
+            tasks += [
+                (local_dir, first_call_idx, last_call_idx, tic, self.speech_master_dir)
+                for first_call_idx, last_call_idx in index.gen_slices(slice_bytes)
+                ]
+        return tasks
+    
+    def gen_call_df(self, results):
+        return pd.DataFrame(
+            [call_row for call_rows in results for call_row in call_rows],
+            columns=['ticker', 'local_dir', 'call_idx', 'title', 'date', 'n_speeches', 'cleaned_dir'],
             )
-        os.makedirs(local_folder_dir, exist_ok=True)
-        success = []
-        success_dir_list = []
\ No newline at end of file
+    
+    def process_single_tic(self, tic, slice_bytes=32 * 2 ** 20):
+        # every transcript of the ticker's exports goes to its own folder,
+        # <file name>_<call_idx>, as in the HTML path; returns one row per
+        # transcript
+        tasks = self.gen_tasks(self.gen_tic_df(tic), tic, slice_bytes)
+        return self.gen_call_df([organise_txt_slice(*task) for task in tasks])
+    
+    def process(self, workers=None, slice_bytes=32 * 2 ** 20):
+        # with workers, slices of about slice_bytes from all exports are
+        # parsed side by side, so one large export is split across the pool
+        tic_list = self.local_dir_df['ticker'].drop_duplicates().to_list()
+        if workers is None or workers <= 1:
+            self.call_df = pd.concat(
+                [self.process_single_tic(tic, slice_bytes) for tic in tqdm(tic_list)],
+                ignore_index=True,
+                )
+        else:
+            task_list = []
+            for tic in tic_list:
+                task_list += self.gen_tasks(self.gen_tic_df(tic), tic, slice_bytes)
+            logging.info(f'{len(task_list)} SLICES, {workers} WORKERS')
+            results = []
+            if task_list:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(tqdm(
+                        executor.map(organise_txt_slice, *zip(*task_list)),
+                        total=len(task_list),
+                        ))
+            self.call_df = self.gen_call_df(results)
+        logging.info(f'{len(self.call_df)} TRANSCRIPTS FROM {len(self.local_dir_df)} FILES')
+        return self.call_df
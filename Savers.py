@@ -3,49 +3,83 @@ Savers.py
 │
 ├── Imports
 │   ├── os
+│   ├── re
 │   ├── time
 │   ├── random
+│   ├── asyncio
+│   ├── json
+│   ├── hashlib
 │   ├── logging
 │   ├── requests
-│   ├── webdriver from selenium
-│   ├── BeautifulSoup from bs4
-│   ├── Options from selenium.webdriver.chrome.options
+│   ├── PageFetcher, RateLimiter, RetryPolicy, HostThrottle from Fetchers
+│   ├── get_metrics from Metrics
+│   ├── ThreadPoolExecutor from concurrent.futures
+│   ├── datetime, timezone from datetime
+│   ├── parsedate_to_datetime from email.utils
 │   ├── load_UA_list from utils
-│   └── raw_content_dir_decoder from utils
+│   ├── load_raw_content_df from utils
+│   ├── gen_ticker_index from utils
+│   └── setup_logging from utils
 │
 ├── Functions
-│   ├── get_transcript_html(url)
+│   ├── get_default_fetcher()
+│   ├── is_blocked_transcript(html_content)
+│   ├── get_transcript_html(url, fetcher=None, retry_policy=None, metrics=None)
+│   ├── parse_retry_after(value)
+│   ├── gen_expected_size(response)
+│   └── verify_download(part_dir, expected_size, etag=None)
 │
 └── Classes
     ├── HTMLRawContentsSaver
-    │   ├── __init__(self, user_agent_list_dir, save_master_dir, raw_content_df_dir)
+    │   ├── __init__(self, user_agent_list_dir, save_master_dir, raw_content_df_dir, fetcher=None, tic_list=None, raw_store_dir=None, trim=False, metrics=None, pages_per_minute=6, throttle_log_dir=None)
+    │   ├── gen_tic_df(self, tic)
     │   ├── save_by_tic(self, tic)
     │   └── save(self)
     │
+    ├── MissingCache
+    │   ├── __init__(self, cache_dir, recheck_ttl=30 * 24 * 3600)
+    │   ├── is_missing(self, trans_id)
+    │   ├── add(self, trans_id)
+    │   ├── discard(self, trans_id)
+    │   └── save(self)
+    │
+    ├── IncompleteDownload(Exception)
+    │
     └── MP3Saver
-        ├── __init__(self, user_agent_list_dir, save_master_dir, raw_content_df_dir)
+        ├── __init__(self, user_agent_list_dir, save_master_dir, raw_content_df_dir, concurrency=4, rate=0.25, max_retries=5, backoff=2, mp3_url_base=MP3_URL_BASE, probe=True, missing_cache_dir=None, recheck_ttl=30 * 24 * 3600, tic_list=None, metrics=None)
+        ├── gen_session(self)
+        ├── gen_tic_df(self, tic)
+        ├── download_mp3(self, session, trans_id, local_dir)
+        ├── probe_mp3(self, session, trans_id)
+        ├── save_single_mp3(self, session, executor, rate_limiter, semaphore, trans_id, local_folder_dir)
+        ├── save_tics_async(self, tic_list)
         ├── save_by_tic(self, tic)
+        └── save(self, tic_list=None)
 '''
 
 import os
+import re
 import time
 import random
+import asyncio
+import json
+import hashlib
 import logging
 import requests
-import pandas as pd
-from selenium import webdriver
-from bs4 import BeautifulSoup
-from selenium.webdriver.chrome.options import Options
-from utils import load_UA_list, raw_content_dir_decoder
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'saver.log'),
-        logging.StreamHandler()
-    ]
-)
+from Fetchers import PageFetcher, RateLimiter, RetryPolicy, HostThrottle
+from Metrics import get_metrics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from utils import load_UA_list, load_raw_content_df, gen_ticker_index, setup_logging
+
+# bs4, Parsers and Stores are imported where the HTML saver needs them, so
+# the MP3 downloads load neither a browser nor an HTML parser
+
+
+MP3_URL_BASE = 'https://static.seekingalpha.com/cdn/s3/transcripts_audio'
+RETRY_STATUS = (429, 503)
+CHUNK_SIZE = 1024 * 1024
 
 '''
 def get_transcript_html(url, user_agent):
@@ -60,35 +94,51 @@ def get_transcript_html(url, user_agent):
     return trans_response.text
 '''
 
-def get_transcript_html(url):
-    count = 0
-    while True:
-        if count > 5: return None
-        
-        browser = webdriver.Edge
-        options = Options()
-        # options.add_argument('--incognito')
-        driver = browser()#options=options)
-        driver.delete_all_cookies()
-        driver.get(url)
-
-        time.sleep(5)
-        html_content = driver.page_source
-        driver.quit()
-        driver.delete_all_cookies()
-        soup = BeautifulSoup(html_content)
-
-        if 'Create a free account' not in soup.text and \
-            '确认您是人类' not in soup.text and \
-            'we’ve hit a bottom.' not in soup.text:
-            break
-        # if len(html_content) > 670000:
-        #     break
-        else:
-            time.sleep(random.randint(30, 45))
-            count += 1
-        
-        return html_content
+_default_fetcher = None
+
+def get_default_fetcher():
+    # one pool of browsers for every caller in the process
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = PageFetcher()
+    return _default_fetcher
+
+def is_blocked_transcript(html_content):
+    from bs4 import BeautifulSoup
+
+    text = BeautifulSoup(html_content, 'lxml').text
+    return 'Create a free account' in text or \
+        '确认您是人类' in text or \
+        'we’ve hit a bottom.' in text
+
+def get_transcript_html(url, fetcher=None, retry_policy=None, metrics=None):
+    # a blocked attempt sends its driver for recycling, so the next one
+    # starts from a fresh browser after the policy's backoff; a browser
+    # error (retry_policy.retry_errors) is retried the same way
+    if fetcher is None:
+        fetcher = get_default_fetcher()
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+    if metrics is None:
+        metrics = get_metrics()
+    
+    for attempt in range(retry_policy.max_attempts):
+        try:
+            html_content, blocked = fetcher.fetch(
+                url,
+                parse=lambda html: (html, is_blocked_transcript(html)),
+                is_blocked=lambda page: page[1],
+                )
+        except retry_policy.retry_errors as e:
+            logging.warning(f'Fetch failed: {url}: {e!r}')
+            blocked = True
+        if not blocked:
+            return html_content
+        if attempt + 1 < retry_policy.max_attempts:
+            with metrics.timer('challenge_wait'):
+                time.sleep(retry_policy.delay(attempt))
+    logging.warning(f'Still blocked after {retry_policy.max_attempts} attempts: {url}')
+    return None
     
 
 class HTMLRawContentsSaver:
@@ -97,24 +147,62 @@ class HTMLRawContentsSaver:
             user_agent_list_dir,
             save_master_dir,
             raw_content_df_dir,
+            fetcher=None,
+            tic_list=None,
+            raw_store_dir=None,
+            trim=False,
+            metrics=None,
+            pages_per_minute=6,
+            throttle_log_dir=None,
             ):
         
+        setup_logging('saver.log')
         self.user_agent_list = load_UA_list(user_agent_list_dir)
         self.save_master_dir = save_master_dir
+        # pages are paced by the fetcher: without one, pages_per_minute
+        # sets the rate limiter of a fresh fetcher (None for the shared
+        # default), and its HostThrottle backs off when the site blocks,
+        # logging every outcome to throttle_log_dir if given
+        if fetcher is None:
+            if pages_per_minute or throttle_log_dir:
+                fetcher = PageFetcher(
+                    rate_limiter=RateLimiter(pages_per_minute / 60) if pages_per_minute else None,
+                    throttle=HostThrottle(log_dir=throttle_log_dir),
+                    )
+            else:
+                fetcher = get_default_fetcher()
+        self.fetcher = fetcher
+        # with raw_store_dir, pages go to a RawPackStore keyed by trans_id
+        # instead of one .txt file each, and local_dir records the store
+        self.raw_store = None
+        if raw_store_dir:
+            from Stores import RawPackStore
+            self.raw_store = RawPackStore(raw_store_dir)
+        # with trim, only the title and content container of a page are
+        # kept, and the size of the full page goes to original_size
+        self.trim = trim
+        # pages written go to the 'write' stage with their bytes
+        self.metrics = metrics if metrics is not None else get_metrics()
 
-        decoder = raw_content_dir_decoder(raw_content_df_dir)  
-        self.raw_df = decoder(raw_content_df_dir)
+        # a worker given tic_list only loads the rows of its own tickers
+        self.raw_df = load_raw_content_df(raw_content_df_dir, tic_list)
         self.raw_df['url'] = self.raw_df['url'].str.split('#source').str[0]
+        self.tic_idx = gen_ticker_index(self.raw_df)
+    
+    def gen_tic_df(self, tic):
+        return self.raw_df.iloc[self.tic_idx.get(tic, [])]
     
     def save_by_tic(self, tic):
         logging.info('-'*20)
         logging.info(f'TARGET TICKER: {tic}')
-        tic_df = self.raw_df[self.raw_df['ticker'] == tic]
+        tic_df = self.gen_tic_df(tic)
         local_folder_dir = '/'.join(
             [self.save_master_dir, tic]
             )
-        os.makedirs(local_folder_dir, exist_ok=True)
+        if self.raw_store is None:
+            os.makedirs(local_folder_dir, exist_ok=True)
         local_dir_list = []
+        original_size_list = []
         
         for idx in tic_df.index:
             title = tic_df.loc[idx, 'title']
@@ -122,26 +210,37 @@ class HTMLRawContentsSaver:
             logging.info(f'Saving {title}')
             url = tic_df.loc[idx, 'url']
             
-            local_dir = local_folder_dir + '/' + title + '.txt'
+            if self.raw_store is None:
+                local_dir = local_folder_dir + '/' + title + '.txt'
+            else:
+                local_dir = self.raw_store.store_master_dir
             local_dir_list.append(local_dir)
             
-            while True:
-                '''
-                # deprecated
-                trans_html = get_transcript_html(url, user_agent=random.choice(self.user_agent_list))
-                if 'Press & Hold' not in trans_html:
-                    break
-                logging.warning('Encountered Press & Hold, retrying...')
-                time.sleep(10)
-                '''
-                trans_html = get_transcript_html(url)
-
-            with open(local_dir, 'w', encoding='u8') as f:
-                f.write(trans_html)
+            trans_html = get_transcript_html(url, self.fetcher, metrics=self.metrics)
+            original_size = None
+            if trans_html is not None:
+                original_size = len(trans_html.encode('u8'))
+                if self.trim:
+                    from Parsers import trim_transcript_html
+                    trans_html, original_size = trim_transcript_html(trans_html)
+            original_size_list.append(original_size)
             
-            time.sleep(10)
+            if trans_html is None:
+                logging.warning(f'Blocked on {title}, skipped')
+                local_dir_list[-1] = None
+            else:
+                with self.metrics.timer('write') as timer:
+                    if self.raw_store is not None:
+                        timer.n_bytes = self.raw_store.put(
+                            tic_df.loc[idx, 'trans_id'], trans_html, tic, original_size
+                            )['length']
+                    else:
+                        with open(local_dir, 'w', encoding='u8') as f:
+                            f.write(trans_html)
+                        timer.n_bytes = os.path.getsize(local_dir)
         logging.info(f'END OF {tic}')
         self.raw_df.loc[tic_df.index, 'local_dir'] = local_dir_list
+        self.raw_df.loc[tic_df.index, 'original_size'] = original_size_list
     
     def save(self):
         tic_list = self.raw_df['ticker'].drop_duplicates().to_list()
@@ -150,65 +249,302 @@ class HTMLRawContentsSaver:
             self.save_by_tic(tic)
 
 
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+class MissingCache:
+    # trans_ids known to have no recording, with the time of their last
+    # 404, kept in a JSON file; entries older than recheck_ttl seconds are
+    # probed again (recheck_ttl=None never re-checks)
+    def __init__(self, cache_dir, recheck_ttl=30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.recheck_ttl = recheck_ttl
+        if os.path.exists(cache_dir):
+            with open(cache_dir, 'r', encoding='u8') as f:
+                self.checked = json.load(f)
+        else:
+            self.checked = {}
+
+    def is_missing(self, trans_id):
+        checked_at = self.checked.get(str(trans_id))
+        if checked_at is None:
+            return False
+        return self.recheck_ttl is None or time.time() - checked_at < self.recheck_ttl
+
+    def add(self, trans_id):
+        self.checked[str(trans_id)] = time.time()
+
+    def discard(self, trans_id):
+        self.checked.pop(str(trans_id), None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_dir) or '.', exist_ok=True)
+        tmp_dir = self.cache_dir + '.tmp'
+        with open(tmp_dir, 'w', encoding='u8') as f:
+            json.dump(self.checked, f)
+        os.replace(tmp_dir, self.cache_dir)
+
+
+class IncompleteDownload(Exception):
+    pass
+
+
+def gen_expected_size(response):
+    # full size of the file: total of Content-Range on a 206, else
+    # Content-Length unless the body is content-encoded
+    if response.status_code == 206:
+        total = response.headers.get('Content-Range', '').split('/')[-1]
+        return int(total) if total.isdigit() else None
+    if 'Content-Encoding' in response.headers:
+        return None
+    length = response.headers.get('Content-Length')
+    return int(length) if length is not None and length.isdigit() else None
+
+def verify_download(part_dir, expected_size, etag=None):
+    size = os.path.getsize(part_dir)
+    if expected_size is not None and size != expected_size:
+        if size > expected_size:
+            os.remove(part_dir)
+        # a short file is kept, the next attempt resumes from its end
+        raise IncompleteDownload(f'{part_dir}: {size} of {expected_size} bytes')
+    
+    # S3 sets the ETag of a single-part upload to the MD5 of the object
+    etag = (etag or '').strip('"')
+    if re.fullmatch(r'[0-9a-f]{32}', etag):
+        md5 = hashlib.md5()
+        with open(part_dir, 'rb') as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                md5.update(chunk)
+        if md5.hexdigest() != etag:
+            os.remove(part_dir)
+            raise IncompleteDownload(f'{part_dir}: checksum mismatch')
+
+
 class MP3Saver:
     def __init__(
             self,
             user_agent_list_dir,
             save_master_dir,
             raw_content_df_dir,
+            concurrency=4,
+            rate=0.25,
+            max_retries=5,
+            backoff=2,
+            mp3_url_base=MP3_URL_BASE,
+            probe=True,
+            missing_cache_dir=None,
+            recheck_ttl=30 * 24 * 3600,
+            tic_list=None,
+            metrics=None,
             ):
             
+        setup_logging('saver.log')
         self.user_agent_list = load_UA_list(user_agent_list_dir)
         self.save_master_dir = save_master_dir     
-        self.raw_df = pd.read_parquet(raw_content_df_dir)  
+        self.raw_df = load_raw_content_df(raw_content_df_dir, tic_list)
+        self.tic_idx = gen_ticker_index(self.raw_df)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_retries = max_retries
+        self.retry_policy = RetryPolicy(base=backoff, max_attempts=max_retries + 1, retry_errors=())
+        self.mp3_url_base = mp3_url_base
+        # with probe, an id is HEAD-checked before its GET so a missing
+        # recording costs one light request instead of a failed download.
+        # The probe and the GET after it share one token: rate bounds
+        # recordings per second, and requests can briefly reach twice that
+        self.probe = probe
+        if missing_cache_dir is None:
+            missing_cache_dir = '/'.join([save_master_dir, 'missing_mp3.json'])
+        self.missing_cache = MissingCache(missing_cache_dir, recheck_ttl)
+        # completed downloads go to the 'download' stage with their bytes,
+        # probes to 'probe', and waits before retries to 'challenge_wait'
+        self.metrics = metrics if metrics is not None else get_metrics()
 
-        
-    def save_by_tic(self, tic):
-        logging.info(f'RETRIEVING MP3 FOR {tic}')
-        tic_df = self.raw_df[self.raw_df['ticker'] == tic]
+    def gen_session(self):
+        # one pooled session for the run, sized to the number of workers
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.concurrency,
+            )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def gen_tic_df(self, tic):
+        tic_df = self.raw_df.iloc[self.tic_idx.get(tic, [])].copy()
         tic_df['year'] = tic_df['date'].str.split('-').str[0].astype(int)
-        tic_df = tic_df[tic_df['year'] > 2016]
+        return tic_df[tic_df['year'] > 2016]
 
-        if len(tic_df) == 0: return None
+    def download_mp3(self, session, trans_id, local_dir):
+        # stream into <local_dir>.part in chunks, resuming a partial file with
+        # a Range request, then verify it and move it into place
+        if os.path.exists(local_dir):
+            return 200, None
+        part_dir = local_dir + '.part'
+        offset = os.path.getsize(part_dir) if os.path.exists(part_dir) else 0
         
-        local_folder_dir = '/'.join(
-            [self.save_master_dir, tic]
-            )
-        os.makedirs(local_folder_dir, exist_ok=True)
-        local_dir_list = []
+        mp3_url = f'{self.mp3_url_base}/{trans_id}.mp3'
+        headers = {'User-Agent':random.choice(self.user_agent_list)}
+        start_time = time.perf_counter()
+        n_bytes = 0
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+        with session.get(mp3_url, headers=headers, timeout=60, stream=True) as response:
+            if response.status_code == 416:
+                os.remove(part_dir)
+                raise IncompleteDownload(f'{trans_id}: cannot resume from byte {offset}')
+            if response.status_code not in (200, 206):
+                return response.status_code, response.headers.get('Retry-After')
+            if response.status_code == 200:
+                # the server ignored the range, so start over
+                offset = 0
+            
+            expected_size = gen_expected_size(response)
+            with open(part_dir, 'ab' if offset else 'wb') as file:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    n_bytes += file.write(chunk)
+            etag = response.headers.get('ETag')
         
-        keep_on = True
-        start = list(tic_df.index)[0]
-        end = list(tic_df.index)[-1]
-        idx = start
+        verify_download(part_dir, expected_size, etag)
+        os.replace(part_dir, local_dir)
+        self.metrics.observe('download', time.perf_counter() - start_time, n_bytes)
+        return 200, None
+
+    def probe_mp3(self, session, trans_id):
+        # HEAD the recording, or GET its first byte where HEAD is refused
+        mp3_url = f'{self.mp3_url_base}/{trans_id}.mp3'
+        headers = {'User-Agent':random.choice(self.user_agent_list)}
+        with self.metrics.timer('probe'):
+            response = session.head(mp3_url, headers=headers, timeout=30, allow_redirects=True)
+            if response.status_code in (403, 405, 501):
+                headers['Range'] = 'bytes=0-0'
+                with session.get(mp3_url, headers=headers, timeout=30, stream=True) as response:
+                    pass
+        if response.status_code == 206:
+            return 200, None
+        return response.status_code, response.headers.get('Retry-After')
+
+    async def save_single_mp3(self, session, executor, rate_limiter, semaphore, trans_id, local_folder_dir):
+        local_dir = '/'.join([local_folder_dir, f'{trans_id}.mp3'])
+        if os.path.exists(local_dir):
+            return local_dir
+        if self.missing_cache.is_missing(trans_id):
+            return None
+        loop = asyncio.get_running_loop()
+        # a .part left by an earlier run means the recording exists, so
+        # only ids without one are probed
+        probed = not self.probe or os.path.exists(local_dir + '.part')
         
-        while keep_on == True:
-            trans_id = tic_df.loc[idx, 'trans_id']
-            mp3_url =  f'https://static.seekingalpha.com/cdn/s3/transcripts_audio/{trans_id}.mp3'
-            
-            response = requests.get(
-                mp3_url,
-                headers={'User-Agent':random.choice(self.user_agent_list)},
-                )
-            if response.status_code == 200:
-                local_dir = '/'.join([local_folder_dir, f'{trans_id}.mp3'])
-                local_dir_list.append(local_dir)
-                with open(local_dir, "wb") as file:
-                    file.write(response.content)
-                tic_df.loc[idx, 'mp3_local_dir'] = local_dir
-                logging.info(f'{tic}: {idx} in {start}-{end}')
-                idx += 1 
-            elif response.status_code == 404:
-                idx += 1 
-                logging.warning(f'No recording for {trans_id}')
-            else:
-                print(response.status_code)
-                time.sleep(30)
-             
-            if idx > end:
-                keep_on = False
+        async with semaphore:
+            attempt = 0
+            follow_probe = False
+            while attempt <= self.max_retries:
+                # the GET that follows a 200 probe rides on the probe's token
+                if not follow_probe:
+                    await rate_limiter.acquire_async()
+                follow_probe = False
+                if probed:
+                    func, args = self.download_mp3, (session, trans_id, local_dir)
+                else:
+                    func, args = self.probe_mp3, (session, trans_id)
+                try:
+                    status, retry_after = await loop.run_in_executor(executor, func, *args)
+                except (requests.RequestException, IncompleteDownload) as e:
+                    logging.warning(f'{trans_id}: {e}')
+                    status, retry_after = None, None
+                
+                if status == 200 and not probed:
+                    probed = follow_probe = True
+                    continue
+                if status == 200:
+                    self.missing_cache.discard(trans_id)
+                    return local_dir
+                if status == 404:
+                    logging.warning(f'No recording for {trans_id}')
+                    self.missing_cache.add(trans_id)
+                    return None
+                
+                # honour the server's Retry-After on 429/503, else back off
+                # exponentially with jitter
+                wait = None
+                if status in RETRY_STATUS:
+                    wait = parse_retry_after(retry_after)
+                if wait is None:
+                    wait = self.retry_policy.delay(attempt)
+                logging.warning(f'{trans_id}: status {status}, retrying in {wait:.1f}s')
+                self.metrics.observe('challenge_wait', wait)
+                await asyncio.sleep(wait)
+                attempt += 1
+        
+        logging.error(f'Gave up on {trans_id} after {self.max_retries + 1} attempts')
+        return None
+
+    async def save_tics_async(self, tic_list):
+        session = self.gen_session()
+        rate_limiter = RateLimiter(self.rate)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tic_df_dict, task_dict = {}, {}
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for tic in tic_list:
+                tic_df = self.gen_tic_df(tic)
+                if len(tic_df) == 0: continue
+                local_folder_dir = '/'.join(
+                    [self.save_master_dir, tic]
+                    )
+                os.makedirs(local_folder_dir, exist_ok=True)
+                tic_df_dict[tic] = tic_df
+                task_dict[tic] = [
+                    self.save_single_mp3(
+                        session, executor, rate_limiter, semaphore, trans_id, local_folder_dir
+                        )
+                    for trans_id in tic_df['trans_id']
+                    ]
             
-            time.sleep(4)
+            logging.info(f'RETRIEVING MP3 FOR {len(tic_df_dict)} TICKERS')
+            start_time = time.perf_counter()
+            try:
+                results = await asyncio.gather(
+                    *[task for tasks in task_dict.values() for task in tasks]
+                    )
+            finally:
+                self.missing_cache.save()
+            elapsed = time.perf_counter() - start_time
+        session.close()
+        
+        result_idx = 0
+        for tic, tic_df in tic_df_dict.items():
+            tic_df['mp3_local_dir'] = results[result_idx:result_idx + len(tic_df)]
+            result_idx += len(tic_df)
+            tic_df.to_parquet(f'{self.save_master_dir}/{tic}/{tic}_recordings.parquet')
+            logging.info(f'END OF {tic}')
+        
+        n_saved = sum(result is not None for result in results)
+        logging.info(
+            f'{n_saved}/{len(results)} RECORDINGS IN {elapsed:.1f}s '
+            f'({len(results) / max(elapsed, 1e-9):.2f} FILES/SEC)'
+            )
+        return tic_df_dict
 
-        logging.info(f'END OF {tic}')
-        tic_df.to_parquet(f'{local_folder_dir}/{tic}_recordings.parquet')
\ No newline at end of file
+    def save_by_tic(self, tic):
+        tic_df_dict = asyncio.run(self.save_tics_async([tic]))
+        return tic_df_dict.get(tic)
+
+    def save(self, tic_list=None):
+        # one rate budget for the whole run, across tickers
+        if tic_list is None:
+            tic_list = self.raw_df['ticker'].drop_duplicates().to_list()
+        return asyncio.run(self.save_tics_async(tic_list))
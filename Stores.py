@@ -0,0 +1,532 @@
+'''
+Stores.py
+│
+├── Imports
+│   ├── os
+│   ├── json
+│   ├── mmap
+│   ├── zlib
+│   ├── pickle
+│   ├── shutil
+│   ├── hashlib
+│   ├── threading
+│   ├── time
+│   ├── fcntl (msvcrt on Windows)
+│   ├── contextmanager from contextlib
+│   ├── pandas as pd
+│   ├── array from array
+│   ├── pyarrow as pa
+│   ├── pyarrow.compute as pc
+│   ├── pyarrow.parquet as pq
+│   └── gen_sidecar_dir from utils
+│
+├── Functions
+│   ├── lock_file(lock_dir)
+│   ├── open_raw_pack_store(store_master_dir)
+│   └── open_parse_cache(cache_dir, max_bytes=PARSE_CACHE_MAX_BYTES)
+│
+└── Classes
+    ├── ParquetSpeechStore
+    │   ├── __init__(self, store_master_dir)
+    │   ├── gen_table(self, df, dict_columns)
+    │   ├── clear(self, tic)
+    │   ├── append(self, participant_df, speech_df, tic, year_dict, batch_name)
+    │   ├── partition_dir(self, table_name, tic, year)
+    │   └── load(self, table_name, filters=None, columns=None)
+    │
+    ├── RawPackStore
+    │   ├── __init__(self, store_master_dir, pack_size=256 * 2 ** 20, level=6)
+    │   ├── refresh(self)
+    │   ├── pack_dir(self, pack_idx)
+    │   ├── put(self, trans_id, html, tic=None, original_size=None)
+    │   ├── add_files(self, raw_dir_list, trans_id_list, tic_list=None)
+    │   ├── get_view(self, pack_idx, end)
+    │   ├── get(self, trans_id)
+    │   ├── iter_pages(self, tic=None)
+    │   ├── stats(self)
+    │   └── close(self)
+    │
+    ├── ParseCache
+    │   ├── __init__(self, cache_dir, max_bytes=PARSE_CACHE_MAX_BYTES, rescan_interval=60)
+    │   ├── gen_key(self, html, version)
+    │   ├── entry_dir(self, key)
+    │   ├── scan(self)
+    │   ├── rescan(self)
+    │   ├── get(self, key)
+    │   ├── put(self, key, value)
+    │   ├── evict(self)
+    │   └── stats(self)
+    │
+    └── TXTExportIndex
+        ├── __init__(self, file_dir)
+        ├── get_view(self)
+        ├── scan(self)
+        ├── build(self)
+        ├── bounds(self, call_idx)
+        ├── read(self, call_idx)
+        ├── gen_slices(self, slice_bytes=32 * 2 ** 20)
+        └── close(self)
+'''
+
+import os
+import json
+import mmap
+import zlib
+import pickle
+import shutil
+import hashlib
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+from contextlib import contextmanager
+import pandas as pd
+from array import array
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from utils import gen_sidecar_dir
+
+TABLE_NAMES = ['participant_info', 'speech']
+PARTITION_COLS = ['ticker', 'year']
+DICT_COLUMNS = {
+    'participant_info': ['name', 'title/affiliation'],
+    'speech': ['name', 'session'],
+    }
+
+
+class ParquetSpeechStore:
+    # participant and speech tables of all transcripts in two datasets,
+    # partitioned as <table>/ticker=<tic>/year=<year>/<batch>-<i>.parquet
+    def __init__(self, store_master_dir):
+        self.store_master_dir = store_master_dir
+        for table_name in TABLE_NAMES:
+            os.makedirs('/'.join([store_master_dir, table_name]), exist_ok=True)
+
+    def gen_table(self, df, dict_columns):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for column in dict_columns:
+            col_idx = table.schema.get_field_index(column)
+            table = table.set_column(
+                col_idx,
+                column,
+                pc.dictionary_encode(table.column(col_idx).cast(pa.string())),
+                )
+        return table
+
+    def clear(self, tic):
+        # batch names depend on how a ticker's transcripts were chunked, so
+        # a rerun with another chunksize would not overwrite the old files:
+        # a ticker's partitions are removed before it is written again
+        for table_name in TABLE_NAMES:
+            shutil.rmtree('/'.join([self.store_master_dir, table_name, f'ticker={tic}']), ignore_errors=True)
+
+    def append(self, participant_df, speech_df, tic, year_dict, batch_name):
+        # year_dict maps trans_id to the year partition of that transcript;
+        # writing the same batch_name again replaces that batch's files
+        for table_name, df in zip(TABLE_NAMES, [participant_df, speech_df]):
+            if len(df) == 0:
+                continue
+            df = df.reset_index(drop=True)
+            df['trans_id'] = df['trans_id'].astype(str)
+            df.insert(0, 'year', df['trans_id'].map(year_dict).astype('int64'))
+            df.insert(0, 'ticker', tic)
+            pq.write_to_dataset(
+                self.gen_table(df, DICT_COLUMNS[table_name]),
+                root_path='/'.join([self.store_master_dir, table_name]),
+                partition_cols=PARTITION_COLS,
+                basename_template=f'{batch_name}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore',
+                )
+
+    def partition_dir(self, table_name, tic, year):
+        return '/'.join([self.store_master_dir, table_name, f'ticker={tic}', f'year={year}'])
+
+    def load(self, table_name, filters=None, columns=None):
+        # e.g. filters=[('ticker', '=', 'AAPL'), ('year', '>=', 2020)]
+        return pd.read_parquet(
+            '/'.join([self.store_master_dir, table_name]),
+            filters=filters,
+            columns=columns,
+            )
+
+
+@contextmanager
+def lock_file(lock_dir):
+    # exclusive lock between processes, held while the block runs
+    with open(lock_dir, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RawPackStore:
+    # raw pages compressed one by one and appended to pack-<n>.bin files of
+    # about pack_size bytes, with one line per page in index.jsonl giving
+    # its pack, offset and length; a page written again supersedes the old
+    # copy. Index lines are written after the page itself, so an
+    # interrupted write leaves at most some unreferenced bytes behind.
+    # Reads go through a read-only mmap of each pack.
+    # Any number of threads and processes may write to one store: a put
+    # holds the thread lock and an exclusive lock on <store>/.lock while it
+    # catches up with the index, appends its page and writes its index
+    # line, so offsets never overlap. Readers take no lock
+    def __init__(self, store_master_dir, pack_size=256 * 2 ** 20, level=6):
+        self.store_master_dir = store_master_dir
+        self.pack_size = pack_size
+        self.level = level
+        self.index_dir = '/'.join([store_master_dir, 'index.jsonl'])
+        self.lock_dir = '/'.join([store_master_dir, '.lock'])
+        self.index = {}
+        self.index_pos = 0
+        self.pack_idx = 0
+        self.views = {}
+        self.lock = threading.Lock()
+        os.makedirs(store_master_dir, exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        # pick up pages appended since the last read of the index, e.g. by
+        # a saver running in another process
+        if not os.path.exists(self.index_dir):
+            return
+        with open(self.index_dir, 'rb') as f:
+            f.seek(self.index_pos)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                entry = json.loads(line)
+                self.index[entry['trans_id']] = entry
+                self.index_pos += len(line)
+                self.pack_idx = max(self.pack_idx, entry['pack'])
+
+    def pack_dir(self, pack_idx):
+        return '/'.join([self.store_master_dir, f'pack-{pack_idx:05d}.bin'])
+
+    def put(self, trans_id, html, tic=None, original_size=None):
+        # original_size: byte size of the page before it was trimmed
+        raw = html.encode('u8')
+        data = zlib.compress(raw, self.level)
+        with self.lock, lock_file(self.lock_dir):
+            # pages and packs other writers added since the last refresh
+            self.refresh()
+            pack_idx = self.pack_idx
+            if os.path.exists(self.pack_dir(pack_idx)) and \
+                    os.path.getsize(self.pack_dir(pack_idx)) + len(data) > self.pack_size:
+                pack_idx = self.pack_idx = pack_idx + 1
+            with open(self.pack_dir(pack_idx), 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            entry = {
+                'trans_id': str(trans_id),
+                'ticker': tic,
+                'pack': pack_idx,
+                'offset': offset,
+                'length': len(data),
+                'size': len(raw),
+                'original_size': len(raw) if original_size is None else original_size,
+                }
+            line = (json.dumps(entry) + '\n').encode('u8')
+            with open(self.index_dir, 'ab') as f:
+                f.write(line)
+            self.index[entry['trans_id']] = entry
+            self.index_pos += len(line)
+        return entry
+
+    def add_files(self, raw_dir_list, trans_id_list, tic_list=None):
+        # pack pages already saved one file per transcript
+        if tic_list is None:
+            tic_list = [None] * len(raw_dir_list)
+        for raw_dir, trans_id, tic in zip(raw_dir_list, trans_id_list, tic_list):
+            with open(raw_dir, 'r', encoding='u8') as f:
+                self.put(trans_id, f.read(), tic)
+
+    def get_view(self, pack_idx, end):
+        # packs only grow, so a mapping is redone once it is too short
+        view = self.views.get(pack_idx)
+        if view is None or len(view) < end:
+            if view is not None:
+                view.close()
+            with open(self.pack_dir(pack_idx), 'rb') as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.views[pack_idx] = view
+        return view
+
+    def get(self, trans_id):
+        trans_id = str(trans_id)
+        if trans_id not in self.index:
+            self.refresh()
+        entry = self.index[trans_id]
+        end = entry['offset'] + entry['length']
+        with self.lock:
+            data = self.get_view(entry['pack'], end)[entry['offset']:end]
+        return zlib.decompress(data).decode('u8')
+
+    def __contains__(self, trans_id):
+        return str(trans_id) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def iter_pages(self, tic=None):
+        # (trans_id, html) in pack order, reading each pack front to back
+        entries = sorted(
+            (entry for entry in self.index.values() if tic is None or entry['ticker'] == tic),
+            key=lambda entry: (entry['pack'], entry['offset']),
+            )
+        f, f_pack = None, None
+        try:
+            for entry in entries:
+                if entry['pack'] != f_pack:
+                    if f is not None:
+                        f.close()
+                    f, f_pack = open(self.pack_dir(entry['pack']), 'rb'), entry['pack']
+                f.seek(entry['offset'])
+                yield entry['trans_id'], zlib.decompress(f.read(entry['length'])).decode('u8')
+        finally:
+            if f is not None:
+                f.close()
+
+    def stats(self):
+        pack_idx_set = {entry['pack'] for entry in self.index.values()}
+        return {
+            'pages': len(self.index),
+            'packs': len(pack_idx_set),
+            'raw_bytes': sum(entry['size'] for entry in self.index.values()),
+            'original_bytes': sum(entry.get('original_size', entry['size']) for entry in self.index.values()),
+            'stored_bytes': sum(os.path.getsize(self.pack_dir(pack_idx)) for pack_idx in pack_idx_set),
+            }
+
+    def close(self):
+        with self.lock:
+            for view in self.views.values():
+                view.close()
+            self.views = {}
+
+
+_raw_pack_stores = {}
+
+def open_raw_pack_store(store_master_dir):
+    # one store per directory and process, so worker processes keep their
+    # index and mappings across tasks
+    if store_master_dir not in _raw_pack_stores:
+        _raw_pack_stores[store_master_dir] = RawPackStore(store_master_dir)
+    return _raw_pack_stores[store_master_dir]
+
+
+PARSE_CACHE_MAX_BYTES = 2 * 2 ** 30
+
+
+class ParseCache:
+    # parse results keyed by a hash of the raw page and a version tag, one
+    # pickled file per entry under <cache_dir>/<key[:2]>/. A hit refreshes
+    # the entry's mtime, and once the cache grows past max_bytes the
+    # entries used longest ago are removed down to 90% of it.
+    # Each process counts its own writes on top of the size found by its
+    # last scan, and rescans every rescan_interval seconds, so with several
+    # workers the cache can exceed max_bytes by what they all write within
+    # one interval before one of them evicts
+    def __init__(self, cache_dir, max_bytes=PARSE_CACHE_MAX_BYTES, rescan_interval=60):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_evicted = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.rescan()
+
+    def gen_key(self, html, version):
+        return hashlib.sha1(f'{version}\0{html}'.encode('u8')).hexdigest()
+
+    def entry_dir(self, key):
+        return '/'.join([self.cache_dir, key[:2], key + '.pkl'])
+
+    def scan(self):
+        # (mtime, path, size) of every entry
+        entries = []
+        for folder in os.scandir(self.cache_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.pkl'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def rescan(self):
+        # entries of every process, and the total size they take
+        entries = self.scan()
+        self.n_bytes = sum(size for _, _, size in entries)
+        self.scanned_at = time.monotonic()
+        return entries
+
+    def get(self, key):
+        entry_dir = self.entry_dir(key)
+        try:
+            with open(entry_dir, 'rb') as f:
+                value = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            self.n_misses += 1
+            return None
+        os.utime(entry_dir)
+        self.n_hits += 1
+        return value
+
+    def put(self, key, value):
+        entry_dir = self.entry_dir(key)
+        data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 1)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        tmp_dir = f'{entry_dir}.{os.getpid()}.tmp'
+        with open(tmp_dir, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_dir, entry_dir)
+        self.n_bytes += len(data)
+        if time.monotonic() - self.scanned_at > self.rescan_interval:
+            self.rescan()
+        if self.n_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        entries = sorted(self.rescan())
+        for _, path, size in entries:
+            if self.n_bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.n_bytes -= size
+            self.n_evicted += 1
+
+    def stats(self):
+        n_lookups = self.n_hits + self.n_misses
+        return {
+            'hits': self.n_hits,
+            'misses': self.n_misses,
+            'hit_rate': self.n_hits / n_lookups if n_lookups else 0,
+            'evicted': self.n_evicted,
+            'bytes': self.n_bytes,
+            }
+
+
+_parse_caches = {}
+
+def open_parse_cache(cache_dir, max_bytes=PARSE_CACHE_MAX_BYTES):
+    # one cache per directory and process, like open_raw_pack_store
+    if cache_dir not in _parse_caches:
+        _parse_caches[cache_dir] = ParseCache(cache_dir, max_bytes)
+    return _parse_caches[cache_dir]
+
+
+# the banner that ends the first line of every transcript of an LSEG text
+# export (see split_txt_transcripts in Parsers)
+TXT_BANNER = b'StreetEvents Event Transcript'
+
+
+class TXTExportIndex:
+    # byte offsets of the transcripts of an LSEG text export, found by
+    # stepping mmap.find from one TXT_BANNER to the next over a read-only
+    # mmap of the file; each banner that ends its line starts a transcript
+    # at that line. Lines before the first banner belong to the first
+    # transcript, so offsets start at 0. The
+    # offsets are saved as 8-byte integers in a sidecar named after the
+    # file's path, size and mtime (see gen_sidecar_dir), so an unchanged
+    # export is scanned once; workers open the same index to read their
+    # slices by offset
+    def __init__(self, file_dir):
+        self.file_dir = file_dir
+        self.size = os.path.getsize(file_dir)
+        self.sidecar_dir = gen_sidecar_dir(file_dir, 'idx')
+        self.view = None
+        self.offsets = array('Q')
+        if os.path.exists(self.sidecar_dir):
+            with open(self.sidecar_dir, 'rb') as f:
+                self.offsets.frombytes(f.read())
+            self.scanned = False
+        else:
+            self.build()
+            self.scanned = True
+
+    def get_view(self):
+        if self.view is None:
+            with open(self.file_dir, 'rb') as f:
+                self.view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.view
+
+    def scan(self):
+        if self.size == 0:
+            return array('Q')
+        # find() runs at memory speed; a hit counts when only whitespace
+        # follows it on its line, and the first banner opens the first
+        # transcript wherever it is
+        view = self.get_view()
+        offsets = array('Q', [0])
+        n_banners, pos = 0, view.find(TXT_BANNER)
+        while pos != -1:
+            line_end = view.find(b'\n', pos)
+            if line_end == -1:
+                line_end = self.size
+            if not view[pos + len(TXT_BANNER):line_end].strip():
+                if n_banners > 0:
+                    offsets.append(view.rfind(b'\n', 0, pos) + 1)
+                n_banners += 1
+            pos = view.find(TXT_BANNER, line_end)
+        return offsets
+
+    def build(self):
+        self.offsets = self.scan()
+        folder, name = os.path.split(self.sidecar_dir)
+        os.makedirs(folder, exist_ok=True)
+        tmp_dir = f'{self.sidecar_dir}.{os.getpid()}.tmp'
+        with open(tmp_dir, 'wb') as f:
+            f.write(self.offsets.tobytes())
+        os.replace(tmp_dir, self.sidecar_dir)
+        # indices of earlier versions of the same export
+        prefix = name.rsplit('.', 2)[0] + '.'
+        for old_name in os.listdir(folder):
+            if old_name.startswith(prefix) and old_name.endswith('.idx') and old_name != name:
+                os.remove(os.path.join(folder, old_name))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def bounds(self, call_idx):
+        end = self.offsets[call_idx + 1] if call_idx + 1 < len(self.offsets) else self.size
+        return self.offsets[call_idx], end
+
+    def read(self, call_idx):
+        # text of one transcript; a BOM can only open the first one
+        start, end = self.bounds(call_idx)
+        return self.get_view()[start:end].decode('utf-8-sig', errors='replace')
+
+    def gen_slices(self, slice_bytes=32 * 2 ** 20):
+        # (first, last) call_idx ranges of consecutive transcripts, each
+        # range about slice_bytes long, for workers to parse side by side
+        slices, first = [], 0
+        for call_idx in range(len(self.offsets)):
+            if self.bounds(call_idx)[1] - self.offsets[first] >= slice_bytes:
+                slices.append((first, call_idx + 1))
+                first = call_idx + 1
+        if first < len(self.offsets):
+            slices.append((first, len(self.offsets)))
+        return slices
+
+    def close(self):
+        if self.view is not None:
+            self.view.close()
+            self.view = None
@@ -0,0 +1,1077 @@
+'''
+benchmarks.py
+│
+├── Imports
+│   ├── os
+│   ├── sys
+│   ├── json
+│   ├── time
+│   ├── platform
+│   ├── random
+│   ├── hashlib
+│   ├── statistics
+│   ├── tempfile
+│   ├── threading
+│   ├── tracemalloc
+│   ├── requests
+│   ├── pandas as pd
+│   ├── BeautifulSoup from bs4
+│   ├── BaseHTTPRequestHandler, ThreadingHTTPServer from http.server
+│   ├── Parsers
+│   ├── HTMLCrawler
+│   └── utils
+│
+├── Functions
+│   ├── time_it(func, *args, repeat=3)
+│   ├── legacy_segmentation(paras)
+│   ├── segmentation(paras)
+│   ├── bench_segmentation(sizes, legacy_max)
+│   ├── per_transcript_tables(html_codes_list)
+│   ├── bench_batch_tables(n_transcripts, n_speeches)
+│   ├── pad_page(html_codes, n_links)
+│   ├── bench_html_parsers(saved_dir, n_files)
+│   ├── serve_fake_mp3s(handler)
+│   ├── bench_mp3_saver(n_files, concurrency_list)
+│   ├── bench_mp3_resume(n_files, payload_size)
+│   ├── bench_missing_cache(n_files)
+│   ├── gen_post_list_html(n_articles, page=1)
+│   ├── per_page_concat(art_lists)
+│   ├── collect_then_build(art_lists)
+│   ├── bench_posting(page_counts, n_articles)
+│   ├── bench_crawl_scheduler(n_tickers, worker_counts, pages_per_minute)
+│   ├── bench_throttle(block_rates, n_tickers)
+│   ├── gen_raw_content_df(n_tickers, n_per_tic)
+│   ├── bench_ticker_index(n_tickers, n_per_tic, n_shard)
+│   ├── bench_sidecar(n_tickers, n_per_tic)
+│   ├── bench_raw_store(n_pages, n_speeches)
+│   ├── bench_trim(n_pages, n_speeches)
+│   ├── bench_parse_cache(n_pages, n_speeches)
+│   ├── gen_transcript_page(n_company, n_others, n_md, n_qa, paras_per_speech, participants_br, layout, padded, seed)
+│   ├── gen_history_html(n_posts, seed, first_id)
+│   ├── gen_txt_transcript(n_company, n_others, n_md, n_qa, paras_per_speech, seed)
+│   ├── gen_txt_export(dir, n_calls, seed, **kwargs)
+│   ├── bench_txt_parser(n_calls)
+│   ├── bench_txt_index(n_calls, worker_counts, slice_bytes)
+│   ├── legacy_process_html(file)
+│   ├── bench_history_bulk(n_pages, n_posts, overlap, worker_counts)
+│   ├── bench_metrics_overhead(n_calls, n_pages)
+│   ├── bench_import_time(repeat)
+│   ├── gen_suite_cases(tmp_dir)
+│   ├── reference_loop(n)
+│   ├── calibrate_number(func, min_sample)
+│   ├── time_sample(func, number)
+│   └── run_suite(baseline_dir, threshold, noise_floor, update, repeat, min_time)
+│
+└── Classes
+    ├── FakeMP3Handler(BaseHTTPRequestHandler)
+    └── FakeBrowser
+'''
+
+import os
+import sys
+import json
+import time
+import platform
+import random
+import hashlib
+import statistics
+import tempfile
+import threading
+import tracemalloc
+import requests
+import pandas as pd
+from bs4 import BeautifulSoup
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import Parsers
+import HTMLCrawler
+import utils
+
+
+def time_it(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def legacy_segmentation(paras):
+    strong_paras_idx = Parsers.find_strong_para(paras)
+    trans_dict = dict(
+        [(para_idx, para.text.strip()) for para_idx, para in enumerate(paras)]
+        )
+    idx_dict = Parsers.gen_start_end_idx_dict(strong_paras_idx, trans_dict)
+    for mode in ['md', 'qa']:
+        Parsers.gen_session_df(idx_dict, strong_paras_idx, paras, mode=mode)
+
+def segmentation(paras):
+    texts, idx_dict, speaker_blocks = Parsers.segment_paragraphs(paras)
+    speech_records = []
+    for mode in ['md', 'qa']:
+        speech_records += Parsers.gen_session_records(idx_dict, speaker_blocks, texts, mode)
+    Parsers.gen_speech_df(speech_records)
+
+def bench_segmentation(sizes=(250, 1000, 4000, 16000), legacy_max=4000):
+    print(f'{"paras":>8} {"single-pass (s)":>16} {"us/para":>8} {"legacy (s)":>12} {"us/para":>8}')
+    for size in sizes:
+        html_codes = gen_transcript_page(n_md=size // 4, n_qa=size - size // 4, paras_per_speech=1)
+        soup = BeautifulSoup(html_codes, 'html.parser')
+        paras = soup.find('div', attrs={'data-test-id': 'content-container'}).find_all('p')
+        new = time_it(segmentation, paras)
+        line = f'{len(paras):>8} {new:>16.4f} {new / len(paras) * 1e6:>8.1f}'
+        if size <= legacy_max:
+            old = time_it(legacy_segmentation, paras, repeat=1)
+            line += f' {old:>12.4f} {old / len(paras) * 1e6:>8.1f}'
+        print(line)
+
+def per_transcript_tables(html_codes_list):
+    for html_codes in html_codes_list:
+        Parsers.organise_single_html(html_codes)
+
+def bench_batch_tables(n_transcripts=50, n_speeches=400):
+    html_codes_list = [gen_transcript_page(n_md=n_speeches // 4, n_qa=n_speeches - n_speeches // 4)] * n_transcripts
+    trans_id_list = list(range(n_transcripts))
+    single = time_it(per_transcript_tables, html_codes_list, repeat=1)
+    batch = time_it(Parsers.organise_html_batch, html_codes_list, trans_id_list, repeat=1)
+    print(f'{n_transcripts} transcripts: per-transcript {single:.3f}s, batch {batch:.3f}s')
+
+def pad_page(html_codes, n_links=3000):
+    # surround the transcript with the kind of boilerplate a saved page has
+    script = '<script>' + 'var s = "<div>&amp;</div>";' * n_links + '</script>'
+    nav = '<nav>' + ''.join(
+        f'<div><a href="/x{i}">link {i}</a><p>ad</p></div>' for i in range(n_links)
+        ) + '</nav>'
+    return html_codes.replace('<body>', '<head>' + script + '</head><body>' + nav)
+
+def bench_html_parsers(saved_dir=None, n_files=20):
+    # per-file time of the full html.parser tree vs the scoped lxml path,
+    # on saved raw pages if a folder is given, else on padded generated ones
+    if saved_dir is not None:
+        file_list = sorted(os.listdir(saved_dir))[:n_files]
+        html_codes_list = []
+        for file in file_list:
+            with open(os.path.join(saved_dir, file), 'r', encoding='u8') as f:
+                html_codes_list.append(f.read())
+    else:
+        html_codes_list = [gen_transcript_page(n_md=50, n_qa=150, padded=True)] * n_files
+    
+    results = {}
+    for html_parser in ['html.parser', 'lxml']:
+        elapsed = 0
+        for html_codes in html_codes_list:
+            elapsed += time_it(Parsers.extract_paragraphs, html_codes, html_parser, repeat=1)
+        results[html_parser] = elapsed / len(html_codes_list)
+        print(f'{html_parser:>12}: {results[html_parser] * 1000:.1f} ms/file')
+    print(f'speedup: {results["html.parser"] / results["lxml"]:.1f}x')
+
+class FakeMP3Handler(BaseHTTPRequestHandler):
+    # stand-in for the recordings CDN: /<trans_id>.mp3 returns payload_size
+    # bytes after `latency` seconds, honouring "Range: bytes=N-" with a 206
+    # and an MD5 ETag; ids ending in 0 are missing, ids divisible by 7 are
+    # throttled once with 429 + Retry-After and, when drop_half is set, ids
+    # divisible by 3 lose the connection halfway through once. total_skew
+    # is added to the size a 206 announces and bad_etag sends the MD5 of
+    # other bytes, to exercise the checks of verify_download
+    latency = 0.05
+    payload_size = 256 * 1024
+    drop_half = False
+    total_skew = 0
+    bad_etag = False
+    throttled = set()
+    dropped = set()
+    n_ranged = 0
+    n_requests = 0
+    lock = threading.Lock()
+    payloads = {}
+
+    @classmethod
+    def reset(cls, **kwargs):
+        cls.total_skew, cls.bad_etag = 0, False
+        for key, value in kwargs.items():
+            setattr(cls, key, value)
+        cls.throttled, cls.dropped, cls.payloads = set(), set(), {}
+        cls.n_ranged = cls.n_requests = 0
+
+    @classmethod
+    def gen_payload(cls, trans_id):
+        with cls.lock:
+            if trans_id not in cls.payloads:
+                block = hashlib.sha256(str(trans_id).encode()).digest()
+                payload = (block * (cls.payload_size // len(block) + 1))[:cls.payload_size]
+                cls.payloads[trans_id] = (payload, hashlib.md5(payload).hexdigest())
+            return cls.payloads[trans_id]
+
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        time.sleep(self.latency)
+        with self.lock:
+            FakeMP3Handler.n_requests += 1
+        trans_id = int(self.path.strip('/').split('.')[0])
+        if trans_id % 10 == 0:
+            self.send_response(404)
+            self.end_headers()
+            return
+        with self.lock:
+            throttle = trans_id % 7 == 0 and trans_id not in self.throttled
+            self.throttled.add(trans_id)
+            drop = send_body and self.drop_half and trans_id % 3 == 0 and trans_id not in self.dropped
+            if send_body:
+                self.dropped.add(trans_id)
+        if throttle:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        
+        payload, etag = self.gen_payload(trans_id)
+        offset = 0
+        range_header = self.headers.get('Range', '')
+        if range_header.startswith('bytes='):
+            with self.lock:
+                FakeMP3Handler.n_ranged += 1
+            offset = int(range_header[len('bytes='):].split('-')[0])
+            if offset >= len(payload):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(payload)}')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {offset}-{len(payload) - 1}/{len(payload) + self.total_skew}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(payload) - offset))
+        if self.bad_etag:
+            etag = hashlib.md5(payload[::-1]).hexdigest()
+        self.send_header('ETag', f'"{etag}"')
+        self.end_headers()
+        if not send_body:
+            return
+        
+        end = offset + (len(payload) - offset) // 2 if drop else len(payload)
+        view = memoryview(payload)
+        for start in range(offset, end, 64 * 1024):
+            self.wfile.write(view[start:min(start + 64 * 1024, end)])
+        if drop:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_fake_mp3s(handler=FakeMP3Handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_mp3_saver(n_files=60, concurrency_list=(1, 4, 16)):
+    from Savers import MP3Saver
+    server = serve_fake_mp3s()
+    mp3_url_base = f'http://127.0.0.1:{server.server_address[1]}'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ua_dir = os.path.join(tmp_dir, 'ua.txt')
+        with open(ua_dir, 'w') as f:
+            f.write('Mozilla/5.0\n')
+        panel_dir = os.path.join(tmp_dir, 'panel.parquet')
+        pd.DataFrame({
+            'ticker': 'FAKE',
+            'date': '2020-01-01',
+            'trans_id': range(1, n_files + 1),
+            }).to_parquet(panel_dir)
+        
+        for concurrency in concurrency_list:
+            FakeMP3Handler.reset()
+            saver = MP3Saver(
+                ua_dir,
+                os.path.join(tmp_dir, f'mp3_{concurrency}'),
+                panel_dir,
+                concurrency=concurrency,
+                rate=None,
+                mp3_url_base=mp3_url_base,
+                )
+            elapsed = time_it(saver.save_by_tic, 'FAKE', repeat=1)
+            print(f'concurrency {concurrency:>3}: {n_files / elapsed:.1f} files/sec')
+    server.shutdown()
+
+def bench_mp3_resume(n_files=6, payload_size=64 * 1024 * 1024):
+    # interrupted downloads resume from their .part file, and peak traced
+    # memory stays at the chunk size however large the recording is
+    from Savers import MP3Saver
+    FakeMP3Handler.reset(latency=0, payload_size=payload_size, drop_half=True)
+    server = serve_fake_mp3s()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ua_dir = os.path.join(tmp_dir, 'ua.txt')
+        with open(ua_dir, 'w') as f:
+            f.write('Mozilla/5.0\n')
+        panel_dir = os.path.join(tmp_dir, 'panel.parquet')
+        pd.DataFrame({
+            'ticker': 'FAKE',
+            'date': '2020-01-01',
+            'trans_id': range(1, n_files + 1),
+            }).to_parquet(panel_dir)
+        saver = MP3Saver(
+            ua_dir,
+            os.path.join(tmp_dir, 'mp3'),
+            panel_dir,
+            concurrency=1,
+            rate=None,
+            backoff=0,
+            mp3_url_base=f'http://127.0.0.1:{server.server_address[1]}',
+            )
+        
+        # the server shares this process, so its payloads are built before
+        # tracing starts to keep them out of the peak
+        for trans_id in range(1, n_files + 1):
+            FakeMP3Handler.gen_payload(trans_id)
+        tracemalloc.start()
+        start = time.perf_counter()
+        tic_df = saver.save_by_tic('FAKE')
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        
+        n_ok = 0
+        for trans_id, local_dir in zip(tic_df['trans_id'], tic_df['mp3_local_dir']):
+            with open(local_dir, 'rb') as f:
+                n_ok += hashlib.md5(f.read()).hexdigest() == FakeMP3Handler.payloads[trans_id][1]
+    server.shutdown()
+    n_ranged = FakeMP3Handler.n_ranged
+    FakeMP3Handler.reset(latency=0.05, payload_size=256 * 1024, drop_half=False)
+    print(
+        f'{n_ok}/{n_files} files of {payload_size >> 20} MB intact '
+        f'({n_ranged} resumed) in {elapsed:.1f}s, '
+        f'peak traced memory {peak / 2 ** 20:.1f} MB'
+        )
+
+def bench_missing_cache(n_files=200):
+    # the second run answers missing ids (every tenth) from the cache
+    from Savers import MP3Saver
+    FakeMP3Handler.reset(latency=0.01)
+    server = serve_fake_mp3s()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ua_dir = os.path.join(tmp_dir, 'ua.txt')
+        with open(ua_dir, 'w') as f:
+            f.write('Mozilla/5.0\n')
+        panel_dir = os.path.join(tmp_dir, 'panel.parquet')
+        pd.DataFrame({
+            'ticker': 'FAKE',
+            'date': '2020-01-01',
+            'trans_id': range(1, n_files + 1),
+            }).to_parquet(panel_dir)
+        
+        for run in ['first run', 'second run']:
+            FakeMP3Handler.n_requests = 0
+            # a fresh saver folder each time, so only the cache carries over
+            saver = MP3Saver(
+                ua_dir,
+                os.path.join(tmp_dir, run),
+                panel_dir,
+                concurrency=8,
+                rate=None,
+                mp3_url_base=f'http://127.0.0.1:{server.server_address[1]}',
+                missing_cache_dir=os.path.join(tmp_dir, 'missing_mp3.json'),
+                )
+            elapsed = time_it(saver.save_by_tic, 'FAKE', repeat=1)
+            print(f'{run}: {FakeMP3Handler.n_requests} requests in {elapsed:.2f}s')
+    server.shutdown()
+    FakeMP3Handler.reset(latency=0.05)
+
+def gen_post_list_html(n_articles, page=1):
+    # a symbol transcripts page in the layout RawHTMLCrawler expects
+    arts = []
+    for i in range(n_articles):
+        trans_id = page * 1000 + i
+        year, quarter = 2024 - (page * n_articles + i) // 4, i % 4 + 1
+        arts.append(
+            '<article>'
+            f'<a data-test-id="post-list-item-title" href="/article/{trans_id}-foo-q{quarter}-{year}-earnings-call-transcript">'
+            f'Foo Inc. (FOO) Q{quarter} {year} Earnings Call Transcript</a>'
+            f'<span data-test-id="post-list-date">Jan {i % 28 + 1}, {year}</span>'
+            '</article>'
+            )
+    return f'<html><body><div data-test-id="post-list">{"".join(arts)}</div></body></html>'
+
+def per_page_concat(art_lists):
+    df = pd.DataFrame()
+    for art_list in art_lists:
+        df = pd.concat([df, HTMLCrawler.organise_posting(art_list)])
+    return df
+
+def collect_then_build(art_lists):
+    fields = None
+    for art_list in art_lists:
+        fields = HTMLCrawler.extract_posting_fields(art_list, fields)
+    return HTMLCrawler.gen_posting_df(fields)
+
+def bench_posting(page_counts=(10, 50, 200), n_articles=20):
+    # one ticker's posting history: a frame per page concatenated page by
+    # page vs fields collected over all pages and one frame at the end
+    for n_pages in page_counts:
+        art_lists = [
+            BeautifulSoup(gen_post_list_html(n_articles, page), 'lxml').find_all('article')
+            for page in range(1, n_pages + 1)
+            ]
+        old = time_it(per_page_concat, art_lists, repeat=1)
+        new = time_it(collect_then_build, art_lists, repeat=1)
+        print(f'{n_pages:>4} pages: per-page concat {old:.3f}s, single build {new:.3f}s')
+
+class FakeBrowser:
+    # stands in for a selenium driver on symbol transcript pages: ticker
+    # <tic> has len(tic) pages of n_articles posts, then the bottom page;
+    # every page takes `latency` seconds to load and a share block_rate of
+    # loads get an access-denied page instead
+    def __init__(self, n_articles=20, latency=0.05, block_rate=0):
+        self.n_articles = n_articles
+        self.latency = latency
+        self.block_rate = block_rate
+        self.page_source = ''
+        self.current_url = ''
+
+    def get(self, url):
+        time.sleep(self.latency)
+        self.current_url = url
+        if random.random() < self.block_rate:
+            self.page_source = '<html><body><p>Access denied</p></body></html>'
+            return
+        tic = url.split('/symbol/')[1].split('/')[0]
+        page = int(url.split('page=')[1])
+        if page > len(tic):
+            self.page_source = '<html><body><p>We’ve hit a bottom</p></body></html>'
+        else:
+            self.page_source = gen_post_list_html(self.n_articles, page)
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        pass
+
+def bench_crawl_scheduler(n_tickers=24, worker_counts=(1, 4, 8), pages_per_minute=None):
+    from Fetchers import DriverPool, PageFetcher, RateLimiter
+    tic_list = [f'T{"X" * (i % 4)}{i}' for i in range(n_tickers)]
+    for n_workers in worker_counts:
+        rate_limiter = RateLimiter(pages_per_minute / 60) if pages_per_minute else None
+        fetcher = PageFetcher(
+            pool=DriverPool(size=n_workers, driver_factory=FakeBrowser),
+            wait=0,
+            rate_limiter=rate_limiter,
+            )
+        crawler = HTMLCrawler.RawHTMLCrawler(fetcher=fetcher)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            df = crawler.crawl_parallel(tic_list, checkpoint_dir=tmp_dir, report_every=5)
+        snap = crawler.progress.snapshot()
+        print(
+            f'{n_workers:>2} workers: {snap["pages"]} pages, {len(df)} records '
+            f'in {snap["elapsed"]:.2f}s ({snap["pages_per_min"]:.0f} pages/min)'
+            )
+
+def bench_throttle(block_rates=(0, 0.1, 0.3), n_tickers=12):
+    # how pacing, block rate and pages that got through respond to blocking
+    from Fetchers import DriverPool, PageFetcher, HostThrottle, RetryPolicy
+    tic_list = [f'T{"X" * (i % 4)}{i}' for i in range(n_tickers)]
+    for block_rate in block_rates:
+        throttle = HostThrottle(
+            min_interval=0, max_interval=0.2, min_samples=10, trip_rate=0.5, cooldown=0.5
+            )
+        fetcher = PageFetcher(
+            pool=DriverPool(size=4, driver_factory=lambda: FakeBrowser(latency=0.01, block_rate=block_rate)),
+            wait=0,
+            throttle=throttle,
+            )
+        crawler = HTMLCrawler.RawHTMLCrawler(
+            fetcher=fetcher,
+            retry_policy=RetryPolicy(base=0.01, cap=0.1, max_attempts=20),
+            )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            crawler.crawl_parallel(tic_list, checkpoint_dir=tmp_dir, report_every=5)
+        for host, stats in throttle.stats().items():
+            print(
+                f'block rate {block_rate:.1f}: {stats["requests"]} requests, '
+                f'{stats["total_block_rate"]:.2f} blocked, {stats["ok_per_min"]:.0f} ok pages/min, '
+                f'interval {stats["interval"]:.3f}s, {stats["trips"]} trips'
+                )
+
+def gen_raw_content_df(n_tickers, n_per_tic):
+    n_rows = n_tickers * n_per_tic
+    return pd.DataFrame({
+        'ticker': [f'T{i // n_per_tic}' for i in range(n_rows)],
+        'title': [f'title {i}' for i in range(n_rows)],
+        'date': ['2020-01-01'] * n_rows,
+        'url': [f'https://seekingalpha.com/article/{i}-x' for i in range(n_rows)],
+        'trans_id': [str(i) for i in range(n_rows)],
+        })
+
+def bench_ticker_index(n_tickers=10000, n_per_tic=20, n_shard=100):
+    # every ticker's rows through a boolean scan of the panel vs the ticker
+    # index, then loading a shard of tickers from parquet in full vs with
+    # the filter pushed down
+    df = gen_raw_content_df(n_tickers, n_per_tic)
+    tic_list = df['ticker'].drop_duplicates().to_list()
+    
+    def scan_all():
+        for tic in tic_list:
+            df[df['ticker'] == tic]
+    
+    def index_all():
+        tic_idx = utils.gen_ticker_index(df)
+        for tic in tic_list:
+            df.iloc[tic_idx[tic]]
+    
+    old = time_it(scan_all, repeat=1)
+    new = time_it(index_all, repeat=1)
+    print(f'{n_tickers} tickers: boolean scans {old:.2f}s, ticker index {new:.2f}s')
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        panel_dir = os.path.join(tmp_dir, 'panel.parquet')
+        df.to_parquet(panel_dir, row_group_size=n_shard * n_per_tic)
+        shard = tic_list[:n_shard]
+        for name, load in [
+                ('full load + filter', lambda: pd.read_parquet(panel_dir)),
+                ('pushdown', lambda: utils.load_raw_content_df(panel_dir, shard)),
+                ]:
+            start_time = time.perf_counter()
+            n_rows = len(load())
+            elapsed = time.perf_counter() - start_time
+            print(f'{n_shard}-ticker shard, {name}: {elapsed:.3f}s, {n_rows} rows read')
+
+def bench_sidecar(n_tickers=13000, n_per_tic=20):
+    # first load of a panel (source parsed, sidecar written) vs later loads
+    # from the sidecar, in full and with column projection
+    df = gen_raw_content_df(n_tickers, n_per_tic)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for extension, write in [
+                ('csv', lambda panel_dir: df.to_csv(panel_dir, index=False)),
+                ('dta', lambda panel_dir: df.to_stata(panel_dir, write_index=False)),
+                ]:
+            panel_dir = os.path.join(tmp_dir, f'panel.{extension}')
+            write(panel_dir)
+            cold = time_it(utils.load_raw_content_df, panel_dir, repeat=1)
+            warm = time_it(utils.load_raw_content_df, panel_dir)
+            projected = time_it(lambda: utils.load_raw_content_df(panel_dir, columns=['ticker', 'trans_id']))
+            print(
+                f'{len(df)} rows from .{extension}: first load {cold:.2f}s, '
+                f'sidecar {warm:.3f}s, 2 columns {projected:.3f}s'
+                )
+
+def bench_raw_store(n_pages=400, n_speeches=200):
+    # padded pages as one .txt each vs a RawPackStore: bytes on disk, files,
+    # and reading every page in random order and in pack order
+    from Stores import RawPackStore
+    html_codes_list = [gen_transcript_page(n_md=n_speeches // 4, n_qa=n_speeches - n_speeches // 4, padded=True)] * n_pages
+    read_order = random.Random(0).sample(range(n_pages), n_pages)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        txt_dir_list = [os.path.join(tmp_dir, f'{i}.txt') for i in range(n_pages)]
+        for txt_dir, html_codes in zip(txt_dir_list, html_codes_list):
+            with open(txt_dir, 'w', encoding='u8') as f:
+                f.write(html_codes)
+        
+        def read_txt():
+            for i in read_order:
+                with open(txt_dir_list[i], 'r', encoding='u8') as f:
+                    f.read()
+        
+        store = RawPackStore(os.path.join(tmp_dir, 'store'), pack_size=64 * 2 ** 20)
+        write = time_it(lambda: store.add_files(txt_dir_list, list(range(n_pages))), repeat=1)
+        stats = store.stats()
+        txt = time_it(read_txt)
+        packed = time_it(lambda: [store.get(i) for i in read_order])
+        streamed = time_it(lambda: list(store.iter_pages()))
+        store.close()
+        print(
+            f'{n_pages} pages: .txt {stats["raw_bytes"] / 2 ** 20:.1f} MB in {n_pages} files, '
+            f'packed {stats["stored_bytes"] / 2 ** 20:.1f} MB in {stats["packs"]} packs (+ index), '
+            f'packing {write:.2f}s'
+            )
+        print(f'read all: .txt {txt:.3f}s, mmap get {packed:.3f}s, pack-order stream {streamed:.3f}s')
+
+def bench_trim(n_pages=40, n_speeches=200):
+    # padded pages as saved before vs trimmed to the content container:
+    # bytes per page, time to trim, and time to parse each version
+    html_codes_list = [gen_transcript_page(n_md=n_speeches // 4, n_qa=n_speeches - n_speeches // 4, padded=True)] * n_pages
+    start_time = time.perf_counter()
+    trimmed_list = [Parsers.trim_transcript_html(html_codes)[0] for html_codes in html_codes_list]
+    trim_time = time.perf_counter() - start_time
+    full_parse = time_it(lambda: [Parsers.organise_single_html(html_codes) for html_codes in html_codes_list])
+    trimmed_parse = time_it(lambda: [Parsers.organise_single_html(html_codes) for html_codes in trimmed_list])
+    full_size = sum(len(html_codes.encode('u8')) for html_codes in html_codes_list) / n_pages / 1024
+    trimmed_size = sum(len(html_codes.encode('u8')) for html_codes in trimmed_list) / n_pages / 1024
+    print(
+        f'{n_pages} pages: {full_size:.0f} KB -> {trimmed_size:.0f} KB per page, '
+        f'trimming {trim_time / n_pages * 1000:.1f} ms/page, parse {full_parse / n_pages * 1000:.1f} -> '
+        f'{trimmed_parse / n_pages * 1000:.1f} ms/page'
+        )
+
+def bench_parse_cache(n_pages=100, n_speeches=200):
+    # parsing pages without a cache, into an empty cache and from a warm
+    # one; then a cache bounded to 60% of that size, so the newer half of
+    # the pages fits under its eviction target and re-parsing it should
+    # mostly hit
+    from Stores import ParseCache
+    html_codes_list = [
+        gen_transcript_page(n_md=n_speeches // 4, n_qa=n_speeches - n_speeches // 4, padded=True, seed=i)
+        for i in range(n_pages)
+        ]
+    
+    def parse_all(parse_cache, start=0):
+        for html_codes in html_codes_list[start:]:
+            Parsers.organise_html_records(html_codes, parse_cache=parse_cache)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parse_cache = ParseCache(tmp_dir)
+        plain = time_it(parse_all, None, repeat=1)
+        cold = time_it(parse_all, parse_cache, repeat=1)
+        warm = time_it(parse_all, parse_cache, repeat=1)
+        stats = parse_cache.stats()
+        print(
+            f'{n_pages} pages: no cache {plain:.2f}s, cold {cold:.2f}s, warm {warm:.3f}s '
+            f'({stats["hits"]} hits, {stats["misses"]} misses, {stats["bytes"] / 2 ** 20:.1f} MB)'
+            )
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parse_cache = ParseCache(tmp_dir, max_bytes=int(stats['bytes'] * 0.6))
+        parse_all(parse_cache)
+        parse_all(parse_cache, start=n_pages // 2)
+        stats = parse_cache.stats()
+        print(
+            f'bounded to 60%, newer half re-parsed: {stats["hits"]} hits, {stats["misses"]} misses, '
+            f'{stats["evicted"]} evicted, {stats["bytes"] / 2 ** 20:.1f} MB kept'
+            )
+
+
+def bench_metrics_overhead(n_calls=1000000, n_pages=200):
+    # cost of a timed block with metrics off and on, and of the parser's
+    # instrumented stages on small pages
+    from Metrics import Metrics, use_metrics
+    
+    def timed_blocks(metrics):
+        for _ in range(n_calls):
+            with metrics.timer('stage'):
+                pass
+    
+    for enabled in (False, True):
+        elapsed = time_it(timed_blocks, Metrics(enabled=enabled), repeat=1)
+        print(f'metrics {"on " if enabled else "off"}: {elapsed / n_calls * 1e9:.0f} ns per timed block')
+    
+    html_codes_list = [gen_transcript_page(n_md=5, n_qa=10, seed=i) for i in range(n_pages)]
+    for enabled in (False, True):
+        with use_metrics(Metrics(enabled=enabled)):
+            elapsed = time_it(lambda: [Parsers.organise_html_records(html_codes) for html_codes in html_codes_list])
+        print(f'metrics {"on " if enabled else "off"}: {elapsed / n_pages * 1000:.3f} ms per small page')
+
+def bench_import_time(repeat=5):
+    # start-up of a fresh interpreter for each entry point, the heavy
+    # packages it ends up loading, and the log files importing it leaves
+    # behind (run from an empty folder)
+    import subprocess
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    cases = {
+        'cli --help': f'import sys; sys.argv = ["cli.py", "--help"]; import cli\ntry: cli.main()\nexcept SystemExit: pass',
+        'parse path': 'import Parsers',
+        'save path': 'import Savers',
+        'crawl path': 'import HTMLCrawler',
+        'all modules': 'import Parsers, Savers, HTMLCrawler',
+        }
+    heavy = ('pandas', 'bs4', 'selenium', 'requests')
+    for name, code in cases.items():
+        script = (
+            f'import sys, time; sys.path.insert(0, {package_dir!r}); start = time.perf_counter()\n'
+            f'{code}\n'
+            f'print(time.perf_counter() - start, *[m for m in {heavy!r} if m in sys.modules], file=sys.stderr)'
+            )
+        timings = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for _ in range(repeat):
+                out = subprocess.run(
+                    [sys.executable, '-c', script], cwd=tmp_dir, capture_output=True, text=True, check=True,
+                    ).stderr.splitlines()[-1].split()
+                timings.append(float(out[0]))
+            log_files = [file for file in os.listdir(tmp_dir) if file.endswith('.log')]
+        print(
+            f'{name:12s}: {min(timings) * 1000:6.0f} ms, loads {out[1:] or "none"}, '
+            f'log files {log_files or "none"}'
+            )
+
+PARTICIPANT_HEADERS = {
+    # layout -> headers of the company and the other participants lists
+    'conference': ('Company Participants', 'Conference Call Participants'),
+    'analysts': ('Participants', 'Analysts'),
+    }
+
+def gen_transcript_page(
+        n_company=3,
+        n_others=4,
+        n_md=20,
+        n_qa=40,
+        paras_per_speech=2,
+        participants_br=False,
+        layout='conference',
+        padded=False,
+        seed=0,
+        ):
+    # a SeekingAlpha-style transcript page: n_company executives and
+    # n_others analysts, listed one per <p> or packed into a single <p>
+    # split by <br/>, under the headers of the given layout; n_md prepared
+    # remarks and n_qa Q&A turns of paras_per_speech paragraphs each
+    rand = random.Random(seed)
+    company = [(f'Executive {i}', f'Officer {i}') for i in range(n_company)]
+    others = [(f'Analyst {i}', f'Bank {i}') for i in range(n_others)]
+    company_header, others_header = PARTICIPANT_HEADERS[layout]
+    
+    def gen_list(people):
+        if participants_br:
+            return ['<p>' + '<br/>'.join(f'<span>{name} - {title}</span>' for name, title in people) + '</p>']
+        return [f'<p>{name} - {title}</p>' for name, title in people]
+    
+    def gen_speech(speaker):
+        words = ' '.join(rand.choice(['revenue', 'margin', 'guidance', 'growth', 'quarter']) for _ in range(30))
+        return [f'<p><strong>{speaker}</strong></p>'] + [
+            f'<p>{words} {rand.random():.6f}</p>' for _ in range(paras_per_speech)
+            ]
+    
+    paras = [f'<p><strong>{company_header}</strong></p>'] + gen_list(company)
+    paras += [f'<p><strong>{others_header}</strong></p>'] + gen_list(others)
+    paras += ['<p><strong>Operator</strong></p>', '<p>Good day and welcome.</p>']
+    for i in range(n_md):
+        paras += gen_speech(company[i % n_company][0])
+    paras += ['<p><strong>Question-and-Answer Session</strong></p>']
+    paras += ['<p><strong>Operator</strong></p>', '<p>Our first question.</p>']
+    for i in range(n_qa):
+        if i % 2 == 0 and n_others:
+            paras += gen_speech(others[i // 2 % n_others][0])
+        else:
+            paras += gen_speech(company[i % n_company][0])
+    paras.append('<p>End of call.</p>')
+    
+    html_codes = (
+        '<html><head><title>Foo Inc. (FOO) Q1 2024 Earnings Call Transcript</title></head>'
+        '<body><div data-test-id="content-container">' + ''.join(paras) + '</div></body></html>'
+        )
+    return pad_page(html_codes) if padded else html_codes
+
+def gen_history_html(n_posts, seed=0, first_id=4000000):
+    # a saved transcripts history page in the layout process_html reads,
+    # listing transcripts first_id to first_id + n_posts - 1
+    rand = random.Random(seed)
+    posts = []
+    for i in range(n_posts):
+        trans_id = first_id + i
+        tic = f'T{rand.randrange(500)}'
+        footer = (
+            f'<a data-test-id="post-list-ticker">{tic}</a>' if i % 10 else ''
+            ) + f'<span data-test-id="post-list-date">{["Jan", "Apr", "Jul", "Oct"][i % 4]} {i % 28 + 1}, 2023</span>'
+        posts.append(
+            '<article><h3>'
+            f'<a data-savepage-href="/article/{trans_id}-foo-q{i % 4 + 1}-2023-earnings-call-transcript#source=x">'
+            f'{tic} Q{i % 4 + 1} 2023 Earnings Call Transcript</a>'
+            f'</h3><footer>{footer}</footer></article>'
+            )
+    return f'<html><body><div data-test-id="post-list">{"".join(posts)}</div></body></html>'
+
+TXT_RULES = {'=': '=' * 80, '-': '-' * 80}
+
+def gen_txt_transcript(
+        n_company=3,
+        n_others=4,
+        n_md=20,
+        n_qa=40,
+        paras_per_speech=2,
+        seed=0,
+        ):
+    # the transcript of gen_transcript_page with the same arguments, in
+    # the layout of an LSEG (StreetEvents) text export
+    rand = random.Random(seed)
+    company = [(f'Executive {i}', f'Officer {i}') for i in range(n_company)]
+    others = [(f'Analyst {i}', f'Bank {i}') for i in range(n_others)]
+    lines = [
+        'Thomson Reuters StreetEvents Event Transcript',
+        'E D I T E D   V E R S I O N',
+        '',
+        'Q1 2024 Foo Inc Earnings Call',
+        'APRIL 25, 2024 / 9:00PM GMT',
+        '',
+        ]
+
+    def gen_list(header, people, affiliation):
+        lines.extend([TXT_RULES['='], header, TXT_RULES['='], ''])
+        for name, title in people:
+            lines.extend([f' * {name}', '   ' + affiliation.format(title)])
+        lines.append('')
+
+    def gen_speech(speaker, texts=None):
+        if texts is None:
+            words = ' '.join(rand.choice(['revenue', 'margin', 'guidance', 'growth', 'quarter']) for _ in range(30))
+            texts = [f'{words} {rand.random():.6f}' for _ in range(paras_per_speech)]
+        lines.extend([TXT_RULES['-'], f'{speaker}   [{len(lines)}]', TXT_RULES['-']])
+        for text in texts:
+            lines.extend([f' {text}', ''])
+        return texts
+
+    gen_list('Corporate Participants', company, 'Foo Inc - {}')
+    gen_list('Conference Call Participiants', others, '{} - Analyst')
+    lines.extend([TXT_RULES['='], 'Presentation'])
+    gen_speech('Operator', ['Good day and welcome.'])
+    for i in range(n_md):
+        gen_speech(f'{company[i % n_company][0]},  Foo Inc - Officer')
+    lines.extend([TXT_RULES['='], 'Questions and Answers'])
+    gen_speech('Operator', ['Our first question.'])
+    for i in range(n_qa):
+        if i % 2 == 0 and n_others:
+            gen_speech(f'{others[i // 2 % n_others][0]},  Bank - Analyst')
+        else:
+            gen_speech(f'{company[i % n_company][0]},  Foo Inc - Officer')
+    lines.extend([' End of call.', ''])
+    for header in ('Definitions', 'Disclaimer'):
+        lines.extend([TXT_RULES['-'], header, TXT_RULES['-'], 'Boilerplate.', ''])
+    return '\n'.join(lines) + '\n'
+
+def gen_txt_export(dir, n_calls, seed=0, **kwargs):
+    # an export file with n_calls transcripts back to back
+    with open(dir, 'w', encoding='u8') as f:
+        for i in range(n_calls):
+            f.write(gen_txt_transcript(seed=seed + i, **kwargs))
+
+def bench_txt_parser(n_calls=2000):
+    # streaming the export line by line vs reading it whole first, and the
+    # speeches against the page parser on the same transcript
+    header_info, _, txt_speeches = Parsers.organise_txt_records(gen_txt_transcript().splitlines())
+    _, html_speeches = Parsers.organise_paragraph_records(Parsers.extract_paragraphs(gen_transcript_page()))
+    # the page parser leaves out the closing paragraph of a page
+    same = [(r.name, r.speech, r.session) for r in txt_speeches[:-1]] == [(r.name, r.speech, r.session) for r in html_speeches]
+    print(f'{header_info["title"]}: {len(txt_speeches)} speeches, same as the page parser: {same}')
+
+    def stream(dir):
+        with open(dir, 'r', encoding='u8') as f:
+            return sum(1 for _ in Parsers.iter_txt_transcripts(f))
+
+    def whole(dir):
+        with open(dir, 'r', encoding='u8') as f:
+            lines = f.readlines()
+        return sum(1 for _ in Parsers.iter_txt_transcripts(lines))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dir = os.path.join(tmp_dir, 'export.txt')
+        gen_txt_export(dir, n_calls)
+        size = os.path.getsize(dir)
+        for name, func in [('streaming', stream), ('whole file', whole)]:
+            elapsed = time_it(func, dir, repeat=1)
+            tracemalloc.start()
+            n_found = func(dir)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(
+                f'{name:>10}: {n_found} transcripts, {size / 2 ** 20 / elapsed:.1f} MB/s, '
+                f'peak {peak / 2 ** 20:.1f} MB for a {size / 2 ** 20:.0f} MB export'
+                )
+
+def bench_txt_index(n_calls=1000, worker_counts=(1, 2, 4), slice_bytes=4 * 2 ** 20):
+    # indexing an export cold and from its sidecar, and parsing it with
+    # TXTContentOrganiser on 1..n workers
+    from Stores import TXTExportIndex
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dir = os.path.join(tmp_dir, 'export.txt')
+        gen_txt_export(dir, n_calls)
+        size = os.path.getsize(dir)
+        for name in ('cold', 'sidecar'):
+            start = time.perf_counter()
+            index = TXTExportIndex(dir)
+            elapsed = time.perf_counter() - start
+            index.close()
+            print(f'index {name:>7}: {len(index)} transcripts in {elapsed * 1000:.1f} ms ({size / 2 ** 20 / elapsed:.0f} MB/s)')
+
+        pd.DataFrame({'ticker': ['FOO'], 'local_dir': [dir]}).to_csv(os.path.join(tmp_dir, 'panel.csv'), index=False)
+        organiser = Parsers.TXTContentOrganiser(tmp_dir, os.path.join(tmp_dir, 'panel.csv'), os.path.join(tmp_dir, 'out'))
+        for workers in worker_counts:
+            elapsed = time_it(organiser.process, workers, slice_bytes, repeat=1)
+            print(f'{workers} workers: {size / 2 ** 20 / elapsed:.1f} MB/s ({os.cpu_count()} CPUs)')
+
+def legacy_process_html(file):
+    # process_html as it was: a BeautifulSoup tree, dateutil per post and
+    # the frame filled cell by cell
+    with open(file, 'r', encoding='u8') as f:
+        content = f.read()
+    post_list = Parsers.get_post_list(BeautifulSoup(content, features='lxml'))
+    post_df = pd.DataFrame(columns=Parsers.POST_COLUMNS, index=range(len(post_list)))
+    for idx in post_df.index:
+        for key, item in Parsers.process_post(post_list[idx]).items():
+            post_df.loc[idx, key] = item
+    post_df['filename'] = file
+    return post_df
+
+def bench_history_bulk(n_pages=100, n_posts=50, overlap=10, worker_counts=(1, 4)):
+    # one panel from n_pages history pages, each sharing `overlap` posts
+    # with the next: legacy per-page frames concatenated and deduplicated,
+    # vs CCHistoryOrganiser.process
+    organiser = Parsers.CCHistoryOrganiser()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for page in range(n_pages):
+            with open(os.path.join(tmp_dir, f'page{page:04d}.html'), 'w', encoding='u8') as f:
+                f.write(gen_history_html(n_posts, seed=page, first_id=4000000 + page * (n_posts - overlap)))
+        file_list = organiser.gen_file_list(tmp_dir)
+
+        def legacy():
+            return pd.concat([legacy_process_html(file) for file in file_list]).drop_duplicates(subset='ID')
+
+        elapsed = time_it(legacy, repeat=1)
+        print(f'  legacy: {len(legacy())} transcripts, {n_pages / elapsed:.0f} pages/s')
+        for workers in worker_counts:
+            elapsed = time_it(organiser.process, tmp_dir, workers, repeat=1)
+            print(f'{workers} workers: {len(organiser.post_df)} transcripts, {n_pages / elapsed:.0f} pages/s ({os.cpu_count()} CPUs)')
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines.json')
+
+def gen_suite_cases(tmp_dir):
+    # name -> zero-argument callable; inputs are built here, outside timing
+    cases = {}
+    for size, (n_md, n_qa) in {'small': (10, 20), 'medium': (50, 150), 'large': (200, 800)}.items():
+        for layout in PARTICIPANT_HEADERS:
+            html_codes = gen_transcript_page(n_md=n_md, n_qa=n_qa, layout=layout, padded=size == 'medium')
+            cases[f'organise_single_html/{size}/{layout}'] = \
+                lambda html_codes=html_codes: Parsers.organise_single_html(html_codes)
+    
+    for n_participants in (5, 50, 200):
+        for participants_br in (False, True):
+            html_codes = gen_transcript_page(
+                n_company=n_participants, n_others=n_participants, n_md=4, n_qa=4,
+                participants_br=participants_br,
+                )
+            paras = Parsers.extract_paragraphs(html_codes)
+            idx_dict = Parsers.segment_paragraphs(paras)[1]
+            cases[f'gen_part_dict/{n_participants}/{"br" if participants_br else "p"}'] = \
+                lambda idx_dict=idx_dict, paras=paras: [
+                    Parsers.gen_part_dict(idx_dict, paras, mode) for mode in ['company', 'others']
+                    ]
+    
+    for n_articles in (20, 100, 500):
+        art_list = BeautifulSoup(gen_post_list_html(n_articles), 'lxml').find_all('article')
+        cases[f'organise_posting/{n_articles}'] = \
+            lambda art_list=art_list: HTMLCrawler.organise_posting(art_list)
+    
+    for n_posts in (20, 200):
+        file = os.path.join(tmp_dir, f'history_{n_posts}.html')
+        with open(file, 'w', encoding='u8') as f:
+            f.write(gen_history_html(n_posts))
+        cases[f'process_html/{n_posts}'] = lambda file=file: Parsers.process_html(file)
+    return cases
+
+def reference_loop(n=200000):
+    # fixed pure-Python work timed next to the cases; the ratio of its time
+    # on two machines scales baselines from one to the other
+    total = 0
+    words = {}
+    for i in range(n):
+        total += i * i % 7
+        words[i % 97] = str(total)
+    return total, len(words)
+
+def calibrate_number(func, min_sample):
+    # calls per sample, doubled until one sample takes min_sample, so that
+    # sub-millisecond cases are not lost in timer noise
+    number = 1
+    while True:
+        elapsed = time_sample(func, number)
+        if elapsed * number >= min_sample:
+            return number
+        number *= 2
+
+def time_sample(func, number):
+    # seconds per call over `number` back-to-back calls
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+def run_suite(
+        baseline_dir=BASELINE_DIR,
+        threshold=1.5,
+        noise_floor=0.002,
+        update=False,
+        repeat=9,
+        min_time=0.5,
+        ):
+    # median time per call of every case over `repeat` rounds; each round
+    # times the reference loop and then every case once, so a slow stretch
+    # of the machine hits all of them alike, and each case gets at least
+    # min_time of wall time in total. Baselines are scaled by the ratio of
+    # the reference loop's median now to when they were recorded, and a
+    # case is a regression when it is both threshold x its scaled baseline
+    # and more than noise_floor seconds slower
+    baseline = {}
+    if os.path.exists(baseline_dir):
+        with open(baseline_dir, 'r', encoding='u8') as f:
+            baseline = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cases = gen_suite_cases(tmp_dir)
+        cases = {'reference_loop': reference_loop, **cases}
+        numbers = {name: calibrate_number(func, min_time / repeat) for name, func in cases.items()}
+        samples = {name: [] for name in cases}
+        for _ in range(repeat):
+            for name, func in cases.items():
+                samples[name].append(time_sample(func, numbers[name]))
+    results = {name: statistics.median(times) for name, times in samples.items()}
+    calibration = results.pop('reference_loop')
+    
+    scale = calibration / baseline['calibration'] if 'calibration' in baseline else 1
+    baselines = baseline.get('cases', {})
+    regressions = []
+    print(f'calibration {calibration * 1000:.3f} ms, {scale:.2f}x the baseline machine')
+    print(f'{"case":<40} {"ms":>10} {"baseline":>10} {"ratio":>7}')
+    for name, seconds in results.items():
+        line = f'{name:<40} {seconds * 1000:>10.3f}'
+        if name in baselines:
+            expected = baselines[name] * scale
+            ratio = seconds / expected
+            line += f' {expected * 1000:>10.3f} {ratio:>7.2f}'
+            if ratio > threshold and seconds - expected > noise_floor:
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+    
+    if update:
+        with open(baseline_dir, 'w', encoding='u8') as f:
+            json.dump(
+                {
+                    'machine': platform.platform(),
+                    'python': platform.python_version(),
+                    'method': f'median of {repeat} interleaved rounds, >= {min_time}s per case',
+                    'calibration': calibration,
+                    'cases': results,
+                    },
+                f,
+                indent=2,
+                )
+    if regressions:
+        print(
+            f'{len(regressions)} REGRESSIONS (> {threshold:.2f}x and {noise_floor * 1000:.0f} ms '
+            f'over baseline): {", ".join(regressions)}'
+            )
+    return results, regressions
+
+if __name__ == '__main__':
+    # python benchmarks.py --suite [--update-baselines]: regression suite
+    # python benchmarks.py [saved_dir]: the comparison benchmarks
+    # (correctness checks live in tests/, run with python -m pytest)
+    if '--suite' in sys.argv:
+        _, regressions = run_suite(update='--update-baselines' in sys.argv)
+        sys.exit(1 if regressions else 0)
+    
+    bench_segmentation()
+    bench_batch_tables()
+    bench_html_parsers(sys.argv[1] if len(sys.argv) > 1 else None)
+    bench_mp3_saver()
+    bench_mp3_resume()
+    bench_missing_cache()
+    bench_posting()
+    bench_crawl_scheduler()
+    bench_throttle()
+    bench_ticker_index()
+    bench_sidecar()
+    bench_raw_store()
+    bench_trim()
+    bench_parse_cache()
+    bench_metrics_overhead()
+    bench_import_time()
+    bench_txt_parser()
+    bench_txt_index()
+    bench_history_bulk()
@@ -0,0 +1,236 @@
+'''
+cli.py
+│
+├── Imports
+│   ├── os
+│   ├── sys
+│   ├── time
+│   ├── logging
+│   └── argparse
+│
+├── Functions
+│   ├── load_tickers(args)
+│   ├── run_crawl(args)
+│   ├── run_download_mp3(args)
+│   ├── run_save_html(args)
+│   ├── run_parse(args)
+│   ├── run_parse_history(args)
+│   ├── gen_arg_parser()
+│   └── main(argv=None)
+│
+└── Usage
+    ├── python cli.py crawl --tickers AAPL MSFT --out panel.parquet
+    ├── python cli.py download-mp3 --ua ua.txt --panel panel.parquet --save-dir Data_rawMP3
+    ├── python cli.py save-html --ua ua.txt --panel panel.parquet --save-dir Data_rawHTML --out raw.parquet
+    ├── python cli.py parse --panel raw.parquet --save-dir Data_rawHTML --speech-dir Data_speeches --workers 4
+    └── python cli.py parse-history history_pages/ --workers 4 --out history.parquet
+'''
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+# the pipeline modules pull in pandas, bs4, selenium and requests, so each
+# subcommand imports only the module it runs, inside its handler: parsing
+# never loads the browser or HTTP stacks, and --help loads none of them
+
+
+def load_tickers(args):
+    # --tickers, or a text file with one ticker per line
+    tic_list = list(args.tickers or [])
+    if args.ticker_file:
+        with open(args.ticker_file, 'r', encoding='u8') as f:
+            tic_list += [line.strip() for line in f if line.strip()]
+    return tic_list or None
+
+def run_crawl(args):
+    tic_list = load_tickers(args)
+    if tic_list is None:
+        raise SystemExit('crawl: give --tickers or --ticker-file')
+    from HTMLCrawler import RawHTMLCrawler
+
+    crawler = RawHTMLCrawler(
+        n_sessions=args.sessions,
+        pages_per_minute=args.pages_per_minute,
+        known_panel_dir=args.known_panel,
+        throttle_log_dir=args.throttle_log,
+        )
+    try:
+        crawler.crawl_parallel(
+            tic_list=tic_list,
+            n_workers=args.workers,
+            checkpoint_dir=args.checkpoint_dir,
+            panel_dir=args.out,
+            )
+    finally:
+        crawler.fetcher.close()
+
+def run_download_mp3(args):
+    import pandas as pd
+    from Savers import MP3Saver
+    from utils import write_panel
+
+    saver = MP3Saver(
+        user_agent_list_dir=args.ua,
+        save_master_dir=args.save_dir,
+        raw_content_df_dir=args.panel,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        missing_cache_dir=args.missing_cache,
+        tic_list=load_tickers(args),
+        )
+    tic_df_dict = saver.save()
+    if args.out and tic_df_dict:
+        write_panel(pd.concat(tic_df_dict.values(), ignore_index=True), args.out)
+
+def run_save_html(args):
+    from Savers import HTMLRawContentsSaver
+    from utils import write_panel
+
+    saver = HTMLRawContentsSaver(
+        user_agent_list_dir=args.ua,
+        save_master_dir=args.save_dir,
+        raw_content_df_dir=args.panel,
+        tic_list=load_tickers(args),
+        raw_store_dir=args.raw_store,
+        trim=args.trim,
+        pages_per_minute=args.pages_per_minute,
+        throttle_log_dir=args.throttle_log,
+        )
+    try:
+        saver.save()
+    finally:
+        saver.fetcher.close()
+    if args.out:
+        write_panel(saver.raw_df, args.out)
+
+def run_parse(args):
+    from Parsers import HTMLContentsOrganiser
+    from utils import write_panel
+
+    organiser = HTMLContentsOrganiser(
+        save_master_dir=args.save_dir,
+        local_dir_df_dir=args.panel,
+        speech_master_dir=args.speech_dir,
+        html_parser=args.html_parser,
+        output_format=args.format,
+        tic_list=load_tickers(args),
+        raw_store_dir=args.raw_store,
+        parse_cache_dir=args.parse_cache,
+        parse_cache_max_bytes=int(args.parse_cache_gb * 2 ** 30),
+        )
+    organiser.process(workers=args.workers, chunksize=args.chunksize)
+    if args.out:
+        write_panel(organiser.local_dir_df, args.out)
+
+def run_parse_history(args):
+    from Parsers import CCHistoryOrganiser
+    from utils import write_panel
+
+    organiser = CCHistoryOrganiser()
+    file_list = []
+    for path in args.paths:
+        file_list += organiser.gen_file_list(path) if os.path.isdir(path) else [path]
+    post_df = organiser.process_files(file_list, workers=args.workers, chunksize=args.chunksize)
+    write_panel(post_df, args.out)
+
+def gen_arg_parser():
+    arg_parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description='Crawl, download and parse earnings conference calls.',
+        )
+    arg_parser.add_argument('--log-file', default=None, help='log to this file as well as stderr (default: <module>.log)')
+    arg_parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    arg_parser.add_argument('--metrics-json', default=None, help='write per-stage metrics to this JSON file')
+    arg_parser.add_argument('--metrics-prom', default=None, help='write per-stage metrics in Prometheus text format')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    def add_tickers(subparser):
+        subparser.add_argument('--tickers', nargs='+', default=None)
+        subparser.add_argument('--ticker-file', default=None, help='text file with one ticker per line')
+
+    crawl = subparsers.add_parser('crawl', help='collect the transcript panel of tickers')
+    add_tickers(crawl)
+    crawl.add_argument('--out', default=None, help='panel file (.parquet, .csv or .xlsx)')
+    crawl.add_argument('--checkpoint-dir', default=None, help='default: Raw_backup, or a folder inside it per known panel')
+    crawl.add_argument('--sessions', type=int, default=1, help='browser sessions')
+    crawl.add_argument('--workers', type=int, default=None, help='tickers crawled at once')
+    crawl.add_argument('--pages-per-minute', type=float, default=None)
+    crawl.add_argument('--known-panel', default=None, help='panel of known transcripts, for an incremental crawl')
+    crawl.add_argument('--throttle-log', default=None, help='CSV of every page outcome the throttle sees')
+    crawl.set_defaults(func=run_crawl, default_log_file='crawler.log')
+
+    download_mp3 = subparsers.add_parser('download-mp3', help='download the recordings of a panel')
+    add_tickers(download_mp3)
+    download_mp3.add_argument('--ua', required=True, help='user agent list')
+    download_mp3.add_argument('--panel', required=True)
+    download_mp3.add_argument('--save-dir', required=True)
+    download_mp3.add_argument('--out', default=None)
+    download_mp3.add_argument('--concurrency', type=int, default=4)
+    download_mp3.add_argument('--rate', type=float, default=0.25, help='downloads per second')
+    download_mp3.add_argument('--missing-cache', default=None)
+    download_mp3.set_defaults(func=run_download_mp3, default_log_file='saver.log')
+
+    save_html = subparsers.add_parser('save-html', help='save the transcript pages of a panel')
+    add_tickers(save_html)
+    save_html.add_argument('--ua', required=True, help='user agent list')
+    save_html.add_argument('--panel', required=True)
+    save_html.add_argument('--save-dir', required=True)
+    save_html.add_argument('--out', default=None)
+    save_html.add_argument('--raw-store', default=None)
+    save_html.add_argument('--trim', action='store_true')
+    save_html.add_argument('--pages-per-minute', type=float, default=6)
+    save_html.add_argument('--throttle-log', default=None, help='CSV of every page outcome the throttle sees')
+    save_html.set_defaults(func=run_save_html, default_log_file='saver.log')
+
+    parse = subparsers.add_parser('parse', help='parse saved transcript pages into speeches')
+    add_tickers(parse)
+    parse.add_argument('--panel', required=True, help='panel with local_dir (or trans_id with --raw-store)')
+    parse.add_argument('--save-dir', required=True)
+    parse.add_argument('--speech-dir', required=True)
+    parse.add_argument('--out', default=None)
+    parse.add_argument('--format', default='csv', choices=['csv', 'parquet'])
+    parse.add_argument('--html-parser', default='lxml')
+    parse.add_argument('--workers', type=int, default=None)
+    parse.add_argument('--chunksize', type=int, default=16)
+    parse.add_argument('--raw-store', default=None)
+    parse.add_argument('--parse-cache', default=None)
+    parse.add_argument('--parse-cache-gb', type=float, default=2, help='size the parse cache is kept under, per worker between rescans')
+    parse.set_defaults(func=run_parse, default_log_file='parsers.log')
+
+    parse_history = subparsers.add_parser('parse-history', help='parse saved transcript history pages into one panel')
+    parse_history.add_argument('paths', nargs='+', help='history pages, or folders of them')
+    parse_history.add_argument('--out', required=True)
+    parse_history.add_argument('--workers', type=int, default=None)
+    parse_history.add_argument('--chunksize', type=int, default=8)
+    parse_history.set_defaults(func=run_parse_history, default_log_file='parsers.log')
+
+    return arg_parser
+
+def main(argv=None):
+    args = gen_arg_parser().parse_args(argv)
+
+    from utils import setup_logging
+    setup_logging(args.log_file or args.default_log_file, getattr(logging, args.log_level))
+    metrics = None
+    if args.metrics_json or args.metrics_prom:
+        from Metrics import enable_metrics
+        metrics = enable_metrics()
+
+    start_time = time.perf_counter()
+    try:
+        args.func(args)
+    finally:
+        logging.info(f'{args.command.upper()} FINISHED IN {time.perf_counter() - start_time:.1f}s')
+        if metrics is not None:
+            if args.metrics_json:
+                metrics.write_json(args.metrics_json)
+            if args.metrics_prom:
+                metrics.write_prometheus(args.metrics_prom)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
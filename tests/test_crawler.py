@@ -0,0 +1,115 @@
+import os
+import pandas as pd
+import pytest
+from benchmarks import FakeBrowser
+from Fetchers import DriverPool, PageFetcher
+from HTMLCrawler import RawHTMLCrawler, TickerQueues, load_manifest
+
+
+class RecordingBrowser(FakeBrowser):
+    # FakeBrowser that keeps every url it loads, and fails like a crashed
+    # process on the tickers in `crash_tics`
+    urls = []
+    crash_tics = set()
+
+    def __init__(self):
+        super().__init__(latency=0)
+
+    def get(self, url):
+        tic = url.split('/symbol/')[1].split('/')[0]
+        if tic in self.crash_tics:
+            raise KeyboardInterrupt
+        self.urls.append(url)
+        super().get(url)
+
+
+@pytest.fixture
+def browser(monkeypatch, tmp_path):
+    # a fresh url record per test; the crawler's log file goes to tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(RecordingBrowser, 'urls', [])
+    monkeypatch.setattr(RecordingBrowser, 'crash_tics', set())
+    return RecordingBrowser
+
+
+def gen_crawler(n_sessions=1, known_panel_dir=None):
+    fetcher = PageFetcher(
+        pool=DriverPool(size=n_sessions, driver_factory=RecordingBrowser),
+        wait=0,
+        )
+    return RawHTMLCrawler(fetcher=fetcher, known_panel_dir=known_panel_dir)
+
+
+def crawled_tics(urls):
+    return {url.split('/symbol/')[1].split('/')[0] for url in urls}
+
+
+def test_worker_steals_when_its_queue_runs_dry():
+    queues = TickerQueues(['A', 'B', 'C', 'D', 'E', 'F'], n_workers=2)
+    assert [queues.next(0) for _ in range(3)] == ['A', 'B', 'C']
+    assert queues.n_stolen == 0
+    
+    # worker 0 is dry and takes from the back of worker 1's share
+    assert queues.next(0) == 'F'
+    assert queues.n_stolen == 1
+    assert [queues.next(1) for _ in range(2)] == ['D', 'E']
+    assert queues.next(1) is None
+    assert queues.next(0) is None
+
+
+def test_crawl_parallel_crawls_every_ticker_once(browser, tmp_path):
+    tic_list = ['A', 'BBBBBB', 'CC', 'DDDDD', 'E', 'FFFF']
+    crawler = gen_crawler(n_sessions=3)
+    df = crawler.crawl_parallel(tic_list, checkpoint_dir=str(tmp_path / 'ckpt'), report_every=1)
+    
+    # len(tic) pages of 20 posts, then the bottom page
+    assert len(browser.urls) == sum(len(tic) + 1 for tic in tic_list)
+    assert len(set(browser.urls)) == len(browser.urls)
+    assert df.groupby('ticker').size().to_dict() == {tic: len(tic) * 20 for tic in tic_list}
+    assert crawler.progress.snapshot()['tickers_done'] == len(tic_list)
+
+
+def test_resume_skips_finished_shards(browser, tmp_path):
+    checkpoint_dir = str(tmp_path / 'ckpt')
+    tic_list = ['AA', 'BBB', 'CRASH', 'DD']
+    browser.crash_tics = {'CRASH'}
+    with pytest.raises(KeyboardInterrupt):
+        gen_crawler().get_art_list_multi_tics(tic_list, checkpoint_dir=checkpoint_dir)
+    assert set(load_manifest(checkpoint_dir)) == {'AA', 'BBB'}
+    # a manifest line cut short by the crash
+    with open(os.path.join(checkpoint_dir, 'manifest.jsonl'), 'a', encoding='u8') as f:
+        f.write('{"ticker": "CRA')
+    
+    browser.crash_tics = set()
+    browser.urls.clear()
+    df = gen_crawler(n_sessions=2).crawl_parallel(tic_list, checkpoint_dir=checkpoint_dir)
+    assert crawled_tics(browser.urls) == {'CRASH', 'DD'}
+    assert df.groupby('ticker').size().to_dict() == {tic: len(tic) * 20 for tic in tic_list}
+
+
+def test_known_ids_stop_pagination(browser, tmp_path):
+    # the listing is newest first: everything from page 2 on is known
+    panel_dir = str(tmp_path / 'known.parquet')
+    pd.DataFrame({
+        'ticker': 'ABCDE',
+        'trans_id': [str(page * 1000 + i) for page in range(2, 6) for i in range(20)],
+        }).to_parquet(panel_dir, index=False)
+    
+    crawler = gen_crawler(known_panel_dir=panel_dir)
+    df = crawler.get_art_list_single_tic('ABCDE')
+    assert [int(url.split('page=')[1]) for url in browser.urls] == [1, 2]
+    assert sorted(df['trans_id'].astype(int)) == list(range(1000, 1020))
+
+
+def test_mismatched_checkpoint_mode_raises(browser, tmp_path):
+    checkpoint_dir = str(tmp_path / 'ckpt')
+    gen_crawler().crawl_parallel(['AA'], checkpoint_dir=checkpoint_dir)
+    assert load_manifest(checkpoint_dir, 'full')['AA']['mode'] == 'full'
+    
+    panel_dir = str(tmp_path / 'known.parquet')
+    pd.DataFrame({'ticker': ['AA'], 'trans_id': ['1000']}).to_parquet(panel_dir, index=False)
+    crawler = gen_crawler(known_panel_dir=panel_dir)
+    browser.urls.clear()
+    with pytest.raises(ValueError):
+        crawler.crawl_parallel(['AA', 'BB'], checkpoint_dir=checkpoint_dir)
+    assert browser.urls == []
@@ -0,0 +1,133 @@
+import pytest
+from selenium.common.exceptions import WebDriverException
+from Fetchers import DriverPool, HostThrottle, PageFetcher
+from Metrics import Metrics
+
+
+class FakeDriver:
+    # stands in for Edge: serves `pages` by url, and once `dead` fails the
+    # health check like a browser that crashed
+    def __init__(self, pages=None):
+        self.pages = pages or {}
+        self.page_source = ''
+        self.dead = False
+        self.n_gets = 0
+        self.n_quits = 0
+
+    @property
+    def current_url(self):
+        if self.dead:
+            raise WebDriverException('browser is gone')
+        return 'about:blank'
+
+    def get(self, url):
+        self.n_gets += 1
+        page = self.pages.get(url, '<html>ok</html>')
+        if isinstance(page, Exception):
+            raise page
+        self.page_source = page
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        self.n_quits += 1
+
+
+class DriverFactory:
+    def __init__(self, pages=None):
+        self.pages = pages
+        self.drivers = []
+
+    def __call__(self):
+        driver = FakeDriver(self.pages)
+        self.drivers.append(driver)
+        return driver
+
+
+def gen_fetcher(factory, max_pages=50):
+    # no waiting between requests, so a blocked page does not slow the test
+    return PageFetcher(
+        pool=DriverPool(size=1, max_pages=max_pages, driver_factory=factory),
+        wait=0,
+        throttle=HostThrottle(max_interval=0),
+        metrics=Metrics(),
+        )
+
+
+def test_unhealthy_driver_is_replaced():
+    factory = DriverFactory()
+    pool = DriverPool(size=1, driver_factory=factory)
+    with pool.driver() as (driver, state):
+        first = driver
+    with pool.driver() as (driver, state):
+        assert driver is first
+    
+    first.dead = True
+    with pool.driver() as (driver, state):
+        assert driver is not first
+    assert first.n_quits == 1
+    assert len(factory.drivers) == 2
+    pool.close()
+
+
+def test_driver_is_recycled_after_max_pages():
+    factory = DriverFactory()
+    pool = DriverPool(size=1, max_pages=3, driver_factory=factory)
+    seen = []
+    for _ in range(7):
+        with pool.driver() as (driver, state):
+            seen.append(driver)
+    
+    assert len(factory.drivers) == 3
+    assert seen == [factory.drivers[0]] * 3 + [factory.drivers[1]] * 3 + [factory.drivers[2]]
+    assert [driver.n_quits for driver in factory.drivers] == [1, 1, 0]
+    pool.close()
+    assert factory.drivers[2].n_quits == 1
+
+
+def test_exception_recycles_driver():
+    factory = DriverFactory()
+    pool = DriverPool(size=1, driver_factory=factory)
+    with pytest.raises(RuntimeError):
+        with pool.driver() as (driver, state):
+            raise RuntimeError
+    assert factory.drivers[0].n_quits == 1
+    
+    with pool.driver() as (driver, state):
+        assert driver is factory.drivers[1]
+    pool.close()
+
+
+def test_blocked_page_recycles_driver():
+    url = 'https://example.com/blocked'
+    factory = DriverFactory({url: '<html>captcha</html>'})
+    fetcher = gen_fetcher(factory)
+    
+    page = fetcher.fetch(url, is_blocked=lambda page: 'captcha' in page)
+    assert page == '<html>captcha</html>'
+    assert factory.drivers[0].n_quits == 1
+    assert fetcher.n_blocked == 1
+    assert fetcher.throttle.stats()['example.com']['blocked'] == 1
+    
+    page = fetcher.fetch('https://example.com/fine', is_blocked=lambda page: 'captcha' in page)
+    assert page == '<html>ok</html>'
+    assert len(factory.drivers) == 2
+    assert factory.drivers[1].n_quits == 0
+    assert fetcher.n_fetched == 2
+    assert fetcher.n_blocked == 1
+    fetcher.close()
+
+
+def test_driver_error_counts_as_failure():
+    url = 'https://example.com/crash'
+    factory = DriverFactory({url: WebDriverException('tab crashed')})
+    fetcher = gen_fetcher(factory)
+    
+    with pytest.raises(WebDriverException):
+        fetcher.fetch(url)
+    assert factory.drivers[0].n_quits == 1
+    assert fetcher.throttle.stats()['example.com']['requests'] == 1
+    assert fetcher.throttle.stats()['example.com']['blocked'] == 1
+    assert fetcher.metrics.snapshot()['stages']['fetch_error']['items'] == 1
+    fetcher.close()
@@ -0,0 +1,90 @@
+import os
+import pandas as pd
+import pytest
+import requests
+from benchmarks import FakeMP3Handler, serve_fake_mp3s
+from Savers import MP3Saver, IncompleteDownload
+
+PAYLOAD_SIZE = 1024 * 1024
+
+
+@pytest.fixture
+def cdn():
+    FakeMP3Handler.reset(latency=0, payload_size=PAYLOAD_SIZE)
+    server = serve_fake_mp3s()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    FakeMP3Handler.reset(latency=0.05, payload_size=256 * 1024)
+
+
+@pytest.fixture
+def download(cdn, tmp_path, monkeypatch):
+    # download(part=None, **kwargs): one download of id 1 against the fake
+    # CDN set up with kwargs, from a .part holding `part` if given
+    monkeypatch.chdir(tmp_path)
+    ua_dir = str(tmp_path / 'ua.txt')
+    with open(ua_dir, 'w') as f:
+        f.write('Mozilla/5.0\n')
+    panel_dir = str(tmp_path / 'panel.parquet')
+    pd.DataFrame({'ticker': 'FAKE', 'date': '2020-01-01', 'trans_id': [1]}).to_parquet(panel_dir)
+    saver = MP3Saver(ua_dir, str(tmp_path), panel_dir, mp3_url_base=cdn)
+    session = requests.Session()
+    local_dir = str(tmp_path / '1.mp3')
+    
+    def download(part=None, **kwargs):
+        FakeMP3Handler.reset(latency=0, payload_size=PAYLOAD_SIZE, **kwargs)
+        for path in [local_dir, local_dir + '.part']:
+            if os.path.exists(path):
+                os.remove(path)
+        if part is not None:
+            with open(local_dir + '.part', 'wb') as f:
+                f.write(part)
+        return saver.download_mp3(session, 1, local_dir)
+    
+    download.local_dir = local_dir
+    download.part_dir = local_dir + '.part'
+    download.retry = lambda: saver.download_mp3(session, 1, local_dir)
+    yield download
+    session.close()
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_resume_requests_only_the_missing_part(download):
+    payload, _ = FakeMP3Handler.gen_payload(1)
+    assert download(payload[:PAYLOAD_SIZE // 2]) == (200, None)
+    assert FakeMP3Handler.n_ranged == 1
+    assert read(download.local_dir) == payload
+    assert not os.path.exists(download.part_dir)
+
+
+def test_416_drops_part_and_restarts(download):
+    # a .part as long as the file cannot be resumed, so it is dropped and
+    # the next attempt starts over
+    payload, _ = FakeMP3Handler.gen_payload(1)
+    with pytest.raises(IncompleteDownload):
+        download(payload + b'x')
+    assert not os.path.exists(download.part_dir)
+    assert download.retry() == (200, None)
+    assert read(download.local_dir) == payload
+
+
+@pytest.mark.parametrize('total_skew, part_kept', [(1, True), (-1, False)])
+def test_size_mismatch_is_not_moved_into_place(download, total_skew, part_kept):
+    # a short file is kept to resume from, a long one is dropped
+    payload, _ = FakeMP3Handler.gen_payload(1)
+    with pytest.raises(IncompleteDownload):
+        download(payload[:PAYLOAD_SIZE // 2], total_skew=total_skew)
+    assert os.path.exists(download.part_dir) == part_kept
+    assert not os.path.exists(download.local_dir)
+
+
+def test_etag_mismatch_drops_file(download):
+    with pytest.raises(IncompleteDownload):
+        download(bad_etag=True)
+    assert not os.path.exists(download.part_dir)
+    assert not os.path.exists(download.local_dir)
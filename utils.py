@@ -1,28 +1,211 @@
-import pandas as pd
+import os
+import hashlib
 import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from functools import partial
+
 
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+SIDECAR_FOLDER = '.sidecars'
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'utils.log'),
-        logging.StreamHandler()
-    ]
-)
+def setup_logging(log_file=None, level=logging.INFO):
+    # configure the root logger once per process: the first call wins and
+    # later calls (e.g. from each class an entry point builds) do nothing,
+    # so no log file is opened just by importing a module
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(level=level, format=LOG_FORMAT, handlers=handlers)
 
-def raw_content_dir_decoder(file_dir):
+def raw_content_dir_decoder(file_dir, cache=True):
+    # with cache, panels that are not parquet are read through a parquet
+    # sidecar written on the first read (see read_with_sidecar)
     extension = file_dir.split('.')[-1]
     if extension == 'csv':
-        return pd.read_csv
+        reader = pd.read_csv
     elif extension =='parquet':
         return pd.read_parquet
     elif extension in ['xlsx', 'xls']:
-        return pd.read_excel
+        reader = pd.read_excel
     elif extension == 'dta':
-        return pd.read_stata
+        reader = pd.read_stata
     else:
         logging.warning('Please save as a file in the following format: .csv, .parquet, .xlsx, .xls, or .dta.')
+        return None
+    return partial(read_with_sidecar, reader=reader) if cache else reader
+
+def write_panel(df, panel_dir):
+    # the writer matching raw_content_dir_decoder: .csv, .xlsx/.xls, and
+    # parquet for anything else
+    extension = panel_dir.split('.')[-1]
+    if extension == 'csv':
+        df.to_csv(panel_dir, index=False)
+    elif extension in ['xlsx', 'xls']:
+        df.to_excel(panel_dir, index=False)
+    else:
+        df.to_parquet(panel_dir, index=False)
+    logging.info(f'PANEL SAVED TO {panel_dir}')
+
+def gen_sidecar_dir(file_dir, extension='parquet'):
+    # the key covers path, size and mtime of the source, so an edited or
+    # replaced source never matches an old sidecar
+    stat = os.stat(file_dir)
+    key = hashlib.md5(
+        f'{os.path.abspath(file_dir)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()
+        ).hexdigest()[:16]
+    folder, name = os.path.split(file_dir)
+    return os.path.join(folder, SIDECAR_FOLDER, f'{name}.{key}.{extension}')
+
+def cache_chunks(chunks, sidecar_dir):
+    # pass chunks through while appending them to the sidecar; the sidecar
+    # only appears once every chunk is written, and a frame arrow cannot
+    # store (e.g. mixed types in a column) or a folder that cannot be
+    # written leaves it unwritten without failing the read. Each process
+    # writes its own tmp file, so workers reading the same panel at once
+    # each move a whole sidecar into place and the last one wins
+    folder, name = os.path.split(sidecar_dir)
+    tmp_dir = f'{sidecar_dir}.{os.getpid()}.tmp'
+    writer = None
+
+    def drop_sidecar(e):
+        logging.warning(f'No sidecar for {name}: {e}')
+        try:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_dir):
+                os.remove(tmp_dir)
+        except OSError:
+            pass
+
+    try:
+        os.makedirs(folder, exist_ok=True)
+    except OSError as e:
+        drop_sidecar(e)
+        tmp_dir = None
+    for chunk in chunks:
+        if tmp_dir is not None:
+            try:
+                table = pa.Table.from_pandas(chunk, preserve_index=False, schema=writer.schema if writer else None)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_dir, table.schema)
+                writer.write_table(table)
+            except (pa.ArrowException, ValueError, TypeError, OSError) as e:
+                drop_sidecar(e)
+                tmp_dir = writer = None
+        yield chunk
+    if writer is None:
+        return
+    try:
+        writer.close()
+        os.replace(tmp_dir, sidecar_dir)
+    except OSError as e:
+        writer = None
+        drop_sidecar(e)
+        return
+    # sidecars of earlier versions of the same source
+    prefix = name.rsplit('.', 2)[0] + '.'
+    for old_name in os.listdir(folder):
+        if old_name.startswith(prefix) and old_name.endswith('.parquet') and old_name != name:
+            try:
+                os.remove(os.path.join(folder, old_name))
+            except FileNotFoundError:
+                pass
+
+def drop_bad_sidecar(sidecar_dir, e):
+    # a sidecar that cannot be read is removed, and the caller reads the
+    # source instead (the next read writes a fresh sidecar)
+    logging.warning(f'Unreadable sidecar {sidecar_dir}, reading the source: {e}')
+    try:
+        os.remove(sidecar_dir)
+    except OSError:
+        pass
+
+def find_sidecar(file_dir):
+    # the sidecar of file_dir if it exists and its footer can be read
+    sidecar_dir = gen_sidecar_dir(file_dir)
+    if not os.path.exists(sidecar_dir):
+        return None
+    try:
+        pq.ParquetFile(sidecar_dir).close()
+    except (pa.ArrowException, OSError) as e:
+        drop_bad_sidecar(sidecar_dir, e)
+        return None
+    return sidecar_dir
+
+def read_with_sidecar(file_dir, reader=pd.read_csv, columns=None):
+    sidecar_dir = gen_sidecar_dir(file_dir)
+    if os.path.exists(sidecar_dir):
+        try:
+            return pd.read_parquet(sidecar_dir, columns=columns)
+        except (pa.ArrowException, OSError) as e:
+            drop_bad_sidecar(sidecar_dir, e)
+    df = reader(file_dir)
+    for _ in cache_chunks([df], sidecar_dir): pass
+    return df if columns is None else df[columns]
+
+def iter_raw_content_df(file_dir, chunksize=100_000, columns=None, cache=True):
+    # the panel in frames of at most chunksize rows; parquet and cached
+    # panels are read batch by batch, csv panels chunk by chunk (writing
+    # the sidecar along the way when all columns are read)
+    extension = file_dir.split('.')[-1]
+    parquet_dir = file_dir if extension == 'parquet' else None
+    if parquet_dir is None and cache:
+        parquet_dir = find_sidecar(file_dir)
+    
+    if parquet_dir is not None:
+        for batch in pq.ParquetFile(parquet_dir).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif extension == 'csv':
+        chunks = pd.read_csv(file_dir, chunksize=chunksize, usecols=columns)
+        if cache and columns is None:
+            chunks = cache_chunks(chunks, gen_sidecar_dir(file_dir))
+        yield from chunks
+    else:
+        df = raw_content_dir_decoder(file_dir, cache)(file_dir)
+        if columns is not None:
+            df = df[columns]
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+def load_raw_content_df(file_dir, tic_list=None, columns=None, chunksize=100_000, cache=True):
+    # with tic_list, only the rows of those tickers are kept: parquet files
+    # and sidecars get the filter pushed down to the reader, other panels
+    # are filtered chunk by chunk, so the rest of the panel is never held
+    # in memory at once
+    if tic_list is None:
+        decoder = raw_content_dir_decoder(file_dir, cache)
+        if decoder is pd.read_parquet or cache:
+            return decoder(file_dir, columns=columns)
+        return decoder(file_dir)[columns] if columns is not None else decoder(file_dir)
+    
+    tic_list = list(tic_list)
+    parquet_dir = file_dir if file_dir.split('.')[-1] == 'parquet' else None
+    if parquet_dir is None and cache:
+        parquet_dir = find_sidecar(file_dir)
+    
+    if parquet_dir is not None:
+        df = pd.read_parquet(parquet_dir, columns=columns, filters=[('ticker', 'in', tic_list)])
+    else:
+        df = pd.concat(
+            [
+                chunk[chunk['ticker'].isin(tic_list)]
+                for chunk in iter_raw_content_df(file_dir, chunksize, cache=cache)
+                ],
+            ignore_index=True,
+            )
+        if columns is not None:
+            df = df[columns]
+    return df.reset_index(drop=True)
+
+def gen_ticker_index(df):
+    # ticker -> positions of its rows, built in one pass; df.iloc[positions]
+    # then replaces a boolean scan of the whole frame per ticker
+    return df.groupby('ticker', sort=False).indices
 
 def load_UA_list(ua_list_dir):
     with open(ua_list_dir, 'r') as f: